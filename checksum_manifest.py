@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+校验和清单
+读写 sha256sum / md5sum / sha1sum / sha512sum / b2sum 生成的清单文件，
+既支持 GNU 格式（"哈希值  路径"，二进制模式为 "哈希值 *路径"），也支持
+BSD 格式（"SHA256 (路径) = 哈希值"）
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 只有哈希值长度可以判断时，按长度推断算法（128 位十六进制默认为 SHA-512）
+ALGORITHMS_BY_LENGTH = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+# BSD 格式中的算法标签
+ALGORITHMS_BY_TAG = {'MD5': 'md5', 'SHA1': 'sha1', 'SHA256': 'sha256', 'SHA512': 'sha512',
+                     'BLAKE2b': 'blake2b'}
+
+# 写入 BSD 格式时使用的标签（也用于 GNU 格式清单的默认文件扩展名）
+TAGS_BY_ALGORITHM = {algorithm: tag for tag, algorithm in ALGORITHMS_BY_TAG.items()}
+
+_BSD_LINE = re.compile(r'^(\\?)([A-Za-z0-9]+)(?:-(\d+))? \((.*)\) = ([0-9a-fA-F]+)$')
+_GNU_LINE = re.compile(r'^(\\?)([0-9a-fA-F]+) [ *](.*)$')
+
+
+class ManifestIndex(NamedTuple):
+    """从清单读取的参考文件：哈希算法，以及 哈希值 → 路径列表"""
+    algorithm: str
+    hashes: Dict[str, List[str]]
+    files: List[str]
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self.hashes.values())
+
+
+def _unescape(path: str) -> str:
+    """还原 GNU 工具对包含反斜杠或换行的文件名所做的转义"""
+    return re.sub(r'\\(.)', lambda match: {'n': '\n', 'r': '\r', '\\': '\\'}.get(match.group(1),
+                                                                               match.group(0)), path)
+
+
+def _escape(path: str) -> Tuple[str, str]:
+    if '\\' in path or '\n' in path or '\r' in path:
+        return '\\', path.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+    return '', path
+
+
+def parse_manifest_line(line: str) -> Optional[Tuple[Optional[str], str, str]]:
+    """
+    解析清单中的一行
+
+    Returns:
+        (算法或 None, 小写十六进制哈希值, 路径)；空行、注释和无法识别的行返回 None
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    match = _BSD_LINE.match(line)
+    if match:
+        escaped, tag, bits, path, digest = match.groups()
+        algorithm = ALGORITHMS_BY_TAG.get(tag)
+        if algorithm is None:
+            return None
+        if algorithm == 'blake2b' and bits and int(bits) != 512:
+            algorithm = f"blake2b-{int(bits) // 8}"
+        return algorithm, digest.lower(), _unescape(path) if escaped else path
+    match = _GNU_LINE.match(line)
+    if match:
+        escaped, digest, path = match.groups()
+        return None, digest.lower(), _unescape(path) if escaped else path
+    return None
+
+
+def _guess_algorithm(manifest_path: str, digest_length: int) -> Optional[str]:
+    """根据清单文件名（例如 SHA256SUMS、backup.md5、b2sums.txt）和哈希值长度推断算法"""
+    name = os.path.basename(manifest_path).lower()
+    if 'b2' in name or 'blake2' in name:
+        return 'blake2b' if digest_length == 128 else f"blake2b-{digest_length // 2}"
+    for algorithm in ('sha512', 'sha256', 'sha1', 'md5'):
+        if algorithm in name and ALGORITHMS_BY_LENGTH.get(digest_length) == algorithm:
+            return algorithm
+    return ALGORITHMS_BY_LENGTH.get(digest_length)
+
+
+def load_manifests(manifest_paths: Iterable[str], progress_callback=None) -> ManifestIndex:
+    """
+    读取一个或多个校验和清单
+
+    Args:
+        manifest_paths: 清单文件路径
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+
+    Returns:
+        ManifestIndex；清单中的相对路径保持原样（通常相对于生成清单时的工作目录）
+
+    Raises:
+        OSError: 清单文件无法读取
+        ValueError: 清单中没有可识别的行，或者多个清单使用了不同的算法
+    """
+    report = progress_callback or print
+    algorithm = None
+    hashes: Dict[str, List[str]] = {}
+    files = []
+    for manifest_path in manifest_paths:
+        files.append(manifest_path)
+        count = 0
+        skipped = 0
+        with open(manifest_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                parsed = parse_manifest_line(line)
+                if parsed is None:
+                    if line.strip() and not line.startswith('#'):
+                        skipped += 1
+                    continue
+                line_algorithm, digest, path = parsed
+                line_algorithm = line_algorithm or _guess_algorithm(manifest_path, len(digest))
+                if line_algorithm is None:
+                    skipped += 1
+                    continue
+                if algorithm is None:
+                    algorithm = line_algorithm
+                elif line_algorithm != algorithm:
+                    raise ValueError(f"清单 {manifest_path} 使用的算法 {line_algorithm.upper()} "
+                                     f"与之前的清单 ({algorithm.upper()}) 不同")
+                hashes.setdefault(digest, []).append(path)
+                count += 1
+        report(f"已读取清单 {manifest_path}: {count} 个文件"
+               + (f"，跳过 {skipped} 行无法识别的内容" if skipped else ""))
+    if algorithm is None:
+        raise ValueError("校验和清单中没有可识别的内容")
+    return ManifestIndex(algorithm, hashes, files)
+
+
+def is_manifest_file(file_path: str) -> bool:
+    """文件的第一行有效内容是否为校验和清单格式"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    return parse_manifest_line(line) is not None
+    except (OSError, UnicodeError):
+        return False
+    return False
+
+
+def write_manifest(file_path: str, entries: Iterable[Tuple[str, str]], algorithm: str = 'sha256',
+                   bsd: Optional[bool] = None) -> int:
+    """
+    写入校验和清单，可以直接用 sha256sum -c 等工具校验
+
+    Args:
+        file_path: 清单文件路径
+        entries: (十六进制哈希值, 文件路径)
+        algorithm: 哈希算法（BSD 格式的标签）
+        bsd: 使用 BSD 格式（"SHA256 (路径) = 哈希值"）；None 表示只在读取时无法从哈希值
+             长度推断出算法时使用（BLAKE2b 的哈希值与 SHA-512、MD5 等长度相同）
+
+    Returns:
+        写入的行数
+    """
+    tag = TAGS_BY_ALGORITHM.get(algorithm)
+    if algorithm.startswith('blake2b-'):
+        tag = f"BLAKE2b-{int(algorithm[len('blake2b-'):]) * 8}"
+    if bsd is None:
+        bsd = algorithm not in ALGORITHMS_BY_LENGTH.values()
+    count = 0
+    with open(file_path, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        for digest, path in entries:
+            prefix, escaped = _escape(path)
+            if bsd and tag:
+                f.write(f"{prefix}{tag} ({escaped}) = {digest}\n")
+            else:
+                f.write(f"{prefix}{digest}  {escaped}\n")
+            count += 1
+    return count
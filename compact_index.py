@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的文件索引
+用数组代替 Python 对象保存大量文件记录：目录路径按前缀压缩，只保存一次；
+文件大小、修改时间等保存在按 (大小, 摘要, 路径) 排序的数组中，用二分查找定位。
+每个文件只占几十个字节，适合千万级文件的参考文件夹。
+索引可以保存为文件，载入时直接内存映射，不需要解析或重新计算哈希值
+"""
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+# 索引文件的文件头标识
+INDEX_MAGIC = b'CDUPIDX1'
+
+# 索引文件中的数据段：(名称, 数组类型，None 表示字节串)
+INDEX_SECTIONS = (
+    ('sizes', 'Q'), ('mtimes', 'q'), ('inos', 'Q'), ('devs', 'Q'),
+    ('digests', None), ('samples', None),
+    ('file_dirs', 'I'), ('name_offsets', 'Q'), ('name_blob', None),
+    ('dir_parents', 'q'), ('dir_name_offsets', 'Q'), ('dir_name_blob', None),
+)
+
+
+class PathTable:
+    """前缀压缩的路径表：每个目录只保存 (父目录编号, 目录名)，文件只保存 (目录编号, 文件名)"""
+
+    def __init__(self):
+        self._dir_ids: Dict[str, int] = {}
+        self.dir_parents = array('q')
+        self.dir_name_offsets = array('Q', [0])
+        self.dir_name_blob = bytearray()
+        self.file_dirs = array('I')
+        self.name_offsets = array('Q', [0])
+        self.name_blob = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.file_dirs)
+
+    def _dir_id(self, directory: str) -> int:
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            parent, name = os.path.split(directory)
+            if parent == directory or not name:
+                # 根目录（或相对路径的起点）
+                parent_id, name = -1, directory
+            else:
+                parent_id = self._dir_id(parent)
+            dir_id = len(self.dir_parents)
+            self.dir_parents.append(parent_id)
+            self.dir_name_blob += os.fsencode(name)
+            self.dir_name_offsets.append(len(self.dir_name_blob))
+            self._dir_ids[directory] = dir_id
+        return dir_id
+
+    def add(self, path: str) -> int:
+        """添加一个文件路径，返回文件编号"""
+        directory, name = os.path.split(path)
+        self.file_dirs.append(self._dir_id(directory))
+        self.name_blob += os.fsencode(name)
+        self.name_offsets.append(len(self.name_blob))
+        return len(self.file_dirs) - 1
+
+    @property
+    def dir_count(self) -> int:
+        return len(self.dir_parents)
+
+    def dir_path(self, dir_id: int) -> str:
+        parts = []
+        while dir_id >= 0:
+            parts.append(os.fsdecode(bytes(
+                self.dir_name_blob[self.dir_name_offsets[dir_id]:self.dir_name_offsets[dir_id + 1]])))
+            dir_id = self.dir_parents[dir_id]
+        return os.path.join(*reversed(parts)) if parts else ''
+
+    def path(self, index: int) -> str:
+        """还原第 index 个文件的完整路径"""
+        name = os.fsdecode(bytes(self.name_blob[self.name_offsets[index]:self.name_offsets[index + 1]]))
+        return os.path.join(self.dir_path(self.file_dirs[index]), name)
+
+    def reorder(self, order: List[int]):
+        """按 order 重新排列文件（目录表不变）"""
+        file_dirs = array('I', (self.file_dirs[index] for index in order))
+        name_offsets = array('Q', [0])
+        name_blob = bytearray()
+        for index in order:
+            name_blob += self.name_blob[self.name_offsets[index]:self.name_offsets[index + 1]]
+            name_offsets.append(len(name_blob))
+        self.file_dirs, self.name_offsets, self.name_blob = file_dirs, name_offsets, name_blob
+
+    def memory_usage(self) -> int:
+        """估算占用的内存（字节）"""
+        return (_buffer_bytes(self.dir_parents) + _buffer_bytes(self.dir_name_offsets)
+                + len(self.dir_name_blob) + _buffer_bytes(self.file_dirs)
+                + _buffer_bytes(self.name_offsets) + len(self.name_blob)
+                + sys.getsizeof(self._dir_ids))
+
+    def finish(self):
+        """添加完所有路径后释放构建期间使用的目录查找表"""
+        self._dir_ids = {}
+
+
+class CompactIndex:
+    """
+    文件记录索引
+
+    先用 add() 逐个添加文件记录（以及可选的定长摘要），再调用 finalize() 排序；
+    之后可以按大小或 (大小, 摘要) 二分查找，用编号取出文件记录。
+    save() 把索引写入文件，load() 以只读方式内存映射载入。
+    """
+
+    def __init__(self, digest_size: int = 0, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            digest_size: 每个文件摘要的字节数，0 表示不保存摘要（只按大小索引）
+            metadata: 随索引文件保存的附加信息（例如哈希算法、采样字节数）
+        """
+        self.digest_size = digest_size
+        self.metadata = dict(metadata or {})
+        self.paths = PathTable()
+        self.sizes = array('Q')
+        self.mtimes = array('q')
+        self.inos = array('Q')
+        self.devs = array('Q')
+        self.digests = bytearray()
+        self.samples = bytearray()
+        self.finalized = False
+        self._mapping = None
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def add(self, record, digest: bytes = b'', sample: Optional[bytes] = None):
+        """
+        添加一个文件记录
+
+        Args:
+            record: 文件记录（需要 path、size、mtime_ns、ino、dev 属性）
+            digest: 原始摘要字节串，长度必须等于 digest_size
+            sample: 头尾样本的原始摘要；只要有一个文件提供了样本摘要，所有文件都要提供
+                   （没有样本的文件传入全零字节串）
+        """
+        if len(digest) != self.digest_size:
+            raise ValueError(f"摘要长度应为 {self.digest_size} 字节: {len(digest)}")
+        if sample is not None:
+            if len(sample) != self.digest_size:
+                raise ValueError(f"样本摘要长度应为 {self.digest_size} 字节: {len(sample)}")
+            self.samples += sample
+        self.paths.add(record.path)
+        self.sizes.append(record.size)
+        self.mtimes.append(record.mtime_ns)
+        self.inos.append(record.ino)
+        self.devs.append(record.dev)
+        self.digests += digest
+        self.finalized = False
+
+    def finalize(self):
+        """
+        按 (大小, 摘要, 路径) 排序，之后才能查找
+
+        排序键是大小和摘要拼成的一个字节串（每个文件一个小对象），只有大小和摘要都相同的
+        文件才需要取出完整路径比较。
+        """
+        keys = [self.sizes[index].to_bytes(8, 'big') + self.digest(index)
+                for index in range(len(self))]
+        order = sorted(range(len(self)), key=keys.__getitem__)
+        start = 0
+        for end in range(1, len(order) + 1):
+            if end < len(order) and keys[order[end]] == keys[order[start]]:
+                continue
+            if end - start > 1:
+                order[start:end] = sorted(order[start:end], key=self.paths.path)
+            start = end
+        del keys
+        self.paths.reorder(order)
+        self.sizes = array('Q', (self.sizes[index] for index in order))
+        self.mtimes = array('q', (self.mtimes[index] for index in order))
+        self.inos = array('Q', (self.inos[index] for index in order))
+        self.devs = array('Q', (self.devs[index] for index in order))
+        self.digests = _reorder_blob(self.digests, self.digest_size, order)
+        self.samples = _reorder_blob(self.samples, self.digest_size, order)
+        self.paths.finish()
+        self.finalized = True
+
+    def digest(self, index: int) -> bytes:
+        size = self.digest_size
+        return bytes(self.digests[index * size:(index + 1) * size])
+
+    def sample(self, index: int) -> bytes:
+        size = self.digest_size
+        return bytes(self.samples[index * size:(index + 1) * size])
+
+    def path(self, index: int) -> str:
+        return self.paths.path(index)
+
+    def record(self, index: int) -> Tuple[str, int, int, int, int]:
+        """取出第 index 个文件记录：(路径, 大小, 修改时间, inode, 设备号)"""
+        return (self.paths.path(index), self.sizes[index], self.mtimes[index],
+                self.inos[index], self.devs[index])
+
+    def size_range(self, size: int) -> range:
+        """大小等于 size 的文件编号范围"""
+        return range(bisect_left(self.sizes, size), bisect_right(self.sizes, size))
+
+    def find(self, size: int, digest: bytes) -> range:
+        """大小和摘要都相同的文件编号范围"""
+        candidates = self.size_range(size)
+        low, high = candidates.start, candidates.stop
+        while low < high:
+            middle = (low + high) // 2
+            if self.digest(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+        start = low
+        high = candidates.stop
+        while low < high:
+            middle = (low + high) // 2
+            if self.digest(middle) <= digest:
+                low = middle + 1
+            else:
+                high = middle
+        return range(start, low)
+
+    def size_count(self) -> int:
+        """不同文件大小的数量"""
+        return sum(1 for index in range(len(self)) if index == 0 or self.sizes[index] != self.sizes[index - 1])
+
+    def memory_usage(self) -> int:
+        """估算占用的内存（字节）；内存映射载入的索引按映射的大小计算"""
+        return (self.paths.memory_usage() + _buffer_bytes(self.sizes) + _buffer_bytes(self.mtimes)
+                + _buffer_bytes(self.inos) + _buffer_bytes(self.devs)
+                + len(self.digests) + len(self.samples))
+
+    def summary(self, extra_bytes: int = 0) -> str:
+        """返回内存占用信息"""
+        usage = self.memory_usage() + extra_bytes
+        per_file = usage / len(self) if len(self) else 0.0
+        kind = "内存映射" if self._mapping is not None else "占用内存"
+        return (f"文件索引: {len(self)} 个文件, {self.paths.dir_count} 个目录, "
+                f"{kind} {usage / (1024 * 1024):.1f} MB (平均每个文件 {per_file:.0f} 字节)")
+
+    def _buffers(self) -> Dict[str, Any]:
+        paths = self.paths
+        return {
+            'sizes': self.sizes, 'mtimes': self.mtimes, 'inos': self.inos, 'devs': self.devs,
+            'digests': self.digests, 'samples': self.samples,
+            'file_dirs': paths.file_dirs, 'name_offsets': paths.name_offsets,
+            'name_blob': paths.name_blob, 'dir_parents': paths.dir_parents,
+            'dir_name_offsets': paths.dir_name_offsets, 'dir_name_blob': paths.dir_name_blob,
+        }
+
+    def save(self, file_path: str):
+        """
+        把索引写入文件（先写临时文件再替换，写入中断不会留下损坏的索引）
+
+        文件格式：8 字节标识、8 字节文件头长度、JSON 文件头，然后是按 8 字节对齐的
+        各个数据段（本机字节序的数组，可以直接内存映射）
+        """
+        if not self.finalized:
+            self.finalize()
+        buffers = self._buffers()
+        sections = {}
+        offset = 0
+        for name, _ in INDEX_SECTIONS:
+            length = _buffer_bytes(buffers[name])
+            sections[name] = [offset, length]
+            offset = _align(offset + length)
+        header = json.dumps({
+            'byteorder': sys.byteorder,
+            'count': len(self),
+            'digest_size': self.digest_size,
+            'metadata': self.metadata,
+            'sections': sections,
+        }, ensure_ascii=False).encode('utf-8')
+        data_start = _align(16 + len(header))
+
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            f.write(b'\0' * (data_start - 16 - len(header)))
+            for name, _ in INDEX_SECTIONS:
+                section_offset, length = sections[name]
+                f.write(b'\0' * (data_start + section_offset - f.tell()))
+                f.write(memoryview(buffers[name]).cast('B'))
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'CompactIndex':
+        """
+        以只读方式内存映射载入索引文件
+
+        Raises:
+            OSError: 文件无法读取
+            ValueError: 不是索引文件，或者是在字节序不同的系统上生成的
+        """
+        with open(file_path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"不是有效的索引文件: {file_path}")
+            header_length = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            if header['byteorder'] != sys.byteorder:
+                raise ValueError(f"索引文件是在字节序为 {header['byteorder']} 的系统上生成的: {file_path}")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data_start = _align(16 + header_length)
+        view = memoryview(mapping)
+        index = cls(header['digest_size'], header['metadata'])
+        buffers = {}
+        for name, typecode in INDEX_SECTIONS:
+            section_offset, length = header['sections'][name]
+            section = view[data_start + section_offset:data_start + section_offset + length]
+            buffers[name] = section.cast(typecode) if typecode else section
+        index.sizes, index.mtimes = buffers['sizes'], buffers['mtimes']
+        index.inos, index.devs = buffers['inos'], buffers['devs']
+        index.digests, index.samples = buffers['digests'], buffers['samples']
+        paths = index.paths
+        paths.file_dirs, paths.name_offsets = buffers['file_dirs'], buffers['name_offsets']
+        paths.name_blob, paths.dir_parents = buffers['name_blob'], buffers['dir_parents']
+        paths.dir_name_offsets, paths.dir_name_blob = buffers['dir_name_offsets'], buffers['dir_name_blob']
+        index.finalized = True
+        index._mapping = mapping
+        return index
+
+
+def _buffer_bytes(values) -> int:
+    return memoryview(values).nbytes
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _reorder_blob(blob: bytearray, item_size: int, order: List[int]) -> bytearray:
+    if not blob:
+        return blob
+    result = bytearray()
+    for index in order:
+        result += blob[index * item_size:(index + 1) * item_size]
+    return result
@@ -1,214 +1,2587 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-文件夹重复文件清理工具
-比较两个文件夹中文件的哈希值，删除第二个文件夹中与第一个文件夹重复的文件
-"""
-
-import os
-import hashlib
-import argparse
-import sys
-from pathlib import Path
-from typing import Dict, Set, List, Tuple
-
-
-def calculate_file_hash(file_path: str, algorithm: str = 'md5') -> str:
-    """
-    计算文件的哈希值
-    
-    Args:
-        file_path: 文件路径
-        algorithm: 哈希算法 ('md5', 'sha1', 'sha256')
-    
-    Returns:
-        文件的哈希值字符串
-    """
-    hash_func = getattr(hashlib, algorithm)()
-    
-    try:
-        with open(file_path, 'rb') as f:
-            # 分块读取文件，避免大文件占用过多内存
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_func.update(chunk)
-        return hash_func.hexdigest()
-    except (IOError, OSError) as e:
-        print(f"错误：无法读取文件 {file_path}: {e}")
-        return ""
-
-
-def get_folder_file_hashes(folder_path: str, algorithm: str = 'md5') -> Dict[str, List[str]]:
-    """
-    获取文件夹中所有文件的哈希值
-    
-    Args:
-        folder_path: 文件夹路径
-        algorithm: 哈希算法
-    
-    Returns:
-        字典，键为哈希值，值为具有该哈希值的文件路径列表
-    """
-    file_hashes = {}
-    folder_path = Path(folder_path)
-    
-    if not folder_path.exists():
-        print(f"错误：文件夹 {folder_path} 不存在")
-        return {}
-    
-    print(f"正在扫描文件夹: {folder_path}")
-    
-    # 递归遍历文件夹中的所有文件
-    for file_path in folder_path.rglob('*'):
-        if file_path.is_file():
-            try:
-                file_hash = calculate_file_hash(str(file_path), algorithm)
-                if file_hash:
-                    if file_hash not in file_hashes:
-                        file_hashes[file_hash] = []
-                    file_hashes[file_hash].append(str(file_path))
-                    print(f"已处理: {file_path.name}")
-            except Exception as e:
-                print(f"处理文件 {file_path} 时出错: {e}")
-    
-    return file_hashes
-
-
-def find_and_delete_duplicates(source_folder: str, target_folder: str, 
-                             algorithm: str = 'md5', dry_run: bool = True) -> Tuple[int, int]:
-    """
-    查找并删除重复文件
-    
-    Args:
-        source_folder: 源文件夹（参考文件夹）
-        target_folder: 目标文件夹（要清理的文件夹）
-        algorithm: 哈希算法
-        dry_run: 是否为试运行模式（不实际删除文件）
-    
-    Returns:
-        元组：(找到的重复文件数量, 实际删除的文件数量)
-    """
-    print("=" * 60)
-    print("开始文件重复检测...")
-    print("=" * 60)
-    
-    # 获取源文件夹的文件哈希值
-    print("\n1. 扫描源文件夹（参考文件夹）...")
-    source_hashes = get_folder_file_hashes(source_folder, algorithm)
-    source_hash_set = set(source_hashes.keys())
-    
-    print(f"源文件夹共有 {sum(len(files) for files in source_hashes.values())} 个文件")
-    print(f"源文件夹共有 {len(source_hash_set)} 个唯一哈希值")
-    
-    # 获取目标文件夹的文件哈希值
-    print("\n2. 扫描目标文件夹（要清理的文件夹）...")
-    target_hashes = get_folder_file_hashes(target_folder, algorithm)
-    
-    print(f"目标文件夹共有 {sum(len(files) for files in target_hashes.values())} 个文件")
-    print(f"目标文件夹共有 {len(target_hashes)} 个唯一哈希值")
-    
-    # 查找重复文件
-    print("\n3. 查找重复文件...")
-    duplicate_files = []
-    
-    for file_hash, file_paths in target_hashes.items():
-        if file_hash in source_hash_set:
-            duplicate_files.extend(file_paths)
-    
-    print(f"\n找到 {len(duplicate_files)} 个重复文件:")
-    for file_path in duplicate_files:
-        print(f"  - {file_path}")
-    
-    # 删除重复文件
-    deleted_count = 0
-    if duplicate_files:
-        if dry_run:
-            print(f"\n[试运行模式] 将删除 {len(duplicate_files)} 个重复文件")
-            print("如要实际删除，请使用 --execute 参数")
-        else:
-            print(f"\n开始删除 {len(duplicate_files)} 个重复文件...")
-            for file_path in duplicate_files:
-                try:
-                    os.remove(file_path)
-                    deleted_count += 1
-                    print(f"已删除: {file_path}")
-                except Exception as e:
-                    print(f"删除文件 {file_path} 失败: {e}")
-    
-    return len(duplicate_files), deleted_count
-
-
-def main():
-    """主函数"""
-    parser = argparse.ArgumentParser(
-        description="比较两个文件夹中文件的哈希值，删除第二个文件夹中的重复文件",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-使用示例:
-  python compare_and_delete_duplicates.py source_folder target_folder
-  python compare_and_delete_duplicates.py source_folder target_folder --execute
-  python compare_and_delete_duplicates.py source_folder target_folder --algorithm sha256 --execute
-        """
-    )
-    
-    parser.add_argument('source_folder', help='源文件夹路径（参考文件夹）')
-    parser.add_argument('target_folder', help='目标文件夹路径（要清理重复文件的文件夹）')
-    parser.add_argument('--algorithm', choices=['md5', 'sha1', 'sha256'], 
-                       default='md5', help='哈希算法 (默认: md5)')
-    parser.add_argument('--execute', action='store_true', 
-                       help='实际执行删除操作（默认为试运行模式）')
-    
-    args = parser.parse_args()
-    
-    # 验证文件夹路径
-    if not os.path.exists(args.source_folder):
-        print(f"错误：源文件夹 '{args.source_folder}' 不存在")
-        sys.exit(1)
-    
-    if not os.path.exists(args.target_folder):
-        print(f"错误：目标文件夹 '{args.target_folder}' 不存在")
-        sys.exit(1)
-    
-    if os.path.abspath(args.source_folder) == os.path.abspath(args.target_folder):
-        print("错误：源文件夹和目标文件夹不能是同一个文件夹")
-        sys.exit(1)
-    
-    # 显示操作信息
-    print("文件夹重复文件清理工具")
-    print("=" * 60)
-    print(f"源文件夹（参考）: {os.path.abspath(args.source_folder)}")
-    print(f"目标文件夹（清理）: {os.path.abspath(args.target_folder)}")
-    print(f"哈希算法: {args.algorithm.upper()}")
-    print(f"运行模式: {'实际删除' if args.execute else '试运行（不删除文件）'}")
-    
-    if not args.execute:
-        print("\n注意：当前为试运行模式，不会实际删除文件")
-        print("如需实际删除，请添加 --execute 参数")
-    
-    # 执行重复文件检测和删除
-    try:
-        duplicate_count, deleted_count = find_and_delete_duplicates(
-            args.source_folder, 
-            args.target_folder, 
-            args.algorithm, 
-            not args.execute
-        )
-        
-        print("\n" + "=" * 60)
-        print("操作完成!")
-        print(f"找到重复文件: {duplicate_count} 个")
-        if args.execute:
-            print(f"成功删除: {deleted_count} 个")
-            if deleted_count < duplicate_count:
-                print(f"删除失败: {duplicate_count - deleted_count} 个")
-        print("=" * 60)
-        
-    except KeyboardInterrupt:
-        print("\n\n操作被用户中断")
-        sys.exit(1)
-    except Exception as e:
-        print(f"\n发生错误: {e}")
-        sys.exit(1)
-
-
-if __name__ == "__main__":
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹重复文件清理工具
+比较两个文件夹中文件的哈希值，删除第二个文件夹中与第一个文件夹重复的文件
+"""
+
+import os
+import hashlib
+import argparse
+import mmap
+import queue
+import signal
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from checksum_manifest import ManifestIndex, is_manifest_file, load_manifests, write_manifest
+from compact_index import INDEX_MAGIC, CompactIndex
+from file_deleter import DEFAULT_DELETE_WORKERS, delete_files, prune_empty_dirs
+from folder_watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, DEFAULT_QUEUE_SIZE, FolderWatcher
+from hash_cache import DEFAULT_MAX_ENTRIES, HashCache
+from progress import ConsoleProgress, ProgressCounters, ScanControl, cancel_on_signals
+
+
+# 强哈希算法（可以作为删除依据）
+STRONG_ALGORITHMS = ('md5', 'sha1', 'sha256', 'sha512', 'blake2b')
+
+# 快速校验和算法：只能用来预筛选，匹配结果必须再用强哈希算法确认
+CHECKSUM_ALGORITHMS = {'crc32': zlib.crc32, 'adler32': zlib.adler32}
+
+# 命令行和 GUI 可选的算法；auto 表示启动时测速选择最快的强哈希算法
+ALGORITHM_CHOICES = STRONG_ALGORITHMS + tuple(CHECKSUM_ALGORITHMS) + ('auto',)
+
+# 校验和预筛选之后用来确认的默认强哈希算法
+DEFAULT_CONFIRM_ALGORITHM = 'sha256'
+
+# 分阶段比较时头部/尾部采样的默认字节数
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+# 默认的并行哈希线程数（机械硬盘上建议使用 1）
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# 哈希计算后端：thread 适合大文件，process 适合大量小文件
+BACKENDS = ('thread', 'process')
+
+# 进程池后端每次发送给工作进程的文件数量
+PROCESS_BATCH_SIZE = 256
+
+# 每个哈希工作线程（进程）最多排队的批次数：暂停或取消时只需等待这些批次读取完成
+SUBMIT_WINDOW = 2
+
+# 协调线程空闲时检查扫描是否被暂停、继续或取消的间隔（秒）
+CONTROL_POLL_INTERVAL = 0.2
+
+# watch 模式下有任务在执行时，等待新文件期间检查已完成结果的间隔（秒）
+WATCH_RESULT_POLL_INTERVAL = 0.05
+
+# 默认的并行目录遍历线程数（网络磁盘上遍历主要在等待 I/O）
+DEFAULT_WALK_WORKERS = 8
+
+# 遍历线程最多领先哈希流水线的文件数量
+WALK_QUEUE_SIZE = 10000
+
+# 计算完整哈希值时每次读取的字节数
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# 文件读取方式：readinto 复用缓冲区；file_digest 使用 hashlib.file_digest（Python 3.11+，
+# 不可用时退回 readinto）；mmap 把大文件映射到内存，一次交给哈希函数
+READ_MODES = ('readinto', 'file_digest', 'mmap')
+
+# 删除前的校验方式：none 只比较哈希值；bytes 与匹配的源文件逐字节比较，
+# 并且只有一个同样大小的源文件时不计算哈希值，直接比较内容
+VERIFY_MODES = ('none', 'bytes')
+
+# 单文件夹去重时每组保留哪一份：oldest 修改时间最早；shortest 路径最短
+KEEP_POLICIES = ('shortest', 'oldest')
+
+# 读取速度测试中每个文件夹最多读取的字节数
+READ_BENCHMARK_BYTES = 256 * 1024 * 1024
+
+# 每个线程复用的读取缓冲区
+_read_buffers = threading.local()
+
+
+class FileRecord(NamedTuple):
+    """
+    遍历目录时取得的文件元数据
+    
+    每个文件在一次运行中只 stat 一次，之后的哈希计算、缓存校验、比较和
+    GUI 结果显示都使用这条记录。Windows 上 ino、dev 和 nlink 可能为 0（未知）。
+    """
+    path: str
+    size: int
+    mtime_ns: int
+    ino: int
+    dev: int
+    nlink: int = 1
+    
+    @property
+    def inode(self) -> Optional[Tuple[int, int]]:
+        """(设备号, inode)；可能还有其他硬链接时才返回，否则为 None"""
+        return (self.dev, self.ino) if self.ino and self.nlink > 1 else None
+
+
+def stat_file_record(file_path: str) -> FileRecord:
+    """
+    为单个文件创建 FileRecord（用于不经过目录遍历得到的路径）
+    
+    Raises:
+        OSError: 文件无法访问
+    """
+    file_stat = os.stat(file_path)
+    return FileRecord(file_path, file_stat.st_size, file_stat.st_mtime_ns,
+                      file_stat.st_ino, file_stat.st_dev, file_stat.st_nlink)
+
+
+def same_file(a: FileRecord, b: FileRecord) -> bool:
+    """两条记录是否为同一个文件（同一个 inode 的硬链接）"""
+    return bool(a.ino) and (a.dev, a.ino) == (b.dev, b.ino)
+
+
+def reclaimable_bytes(records: Iterable[FileRecord]) -> int:
+    """
+    删除这些文件实际能释放的空间：硬链接按 inode 计算，一个 inode 的所有链接
+    都被删除时才释放一份空间
+    """
+    total = 0
+    links = {}
+    for record in records:
+        inode = record.inode
+        if inode is None:
+            total += record.size
+        else:
+            count, _, _ = links.get(inode, (0, 0, 0))
+            links[inode] = (count + 1, record.size, record.nlink)
+    return total + sum(size for count, size, nlink in links.values() if count >= nlink)
+
+
+class ChecksumHash:
+    """把 zlib.crc32 / zlib.adler32 包装成与 hashlib 相同接口的对象"""
+    
+    def __init__(self, name: str, value: Optional[int] = None):
+        self.name = name
+        self.digest_size = 4
+        self._func = CHECKSUM_ALGORITHMS[name]
+        self._value = self._func(b"") if value is None else value
+    
+    def update(self, data):
+        self._value = self._func(data, self._value)
+    
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, 'big')
+    
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+    
+    def copy(self) -> 'ChecksumHash':
+        return ChecksumHash(self.name, self._value)
+
+
+def new_hash(algorithm: str):
+    """
+    创建哈希对象
+    
+    Args:
+        algorithm: 算法名称。除 hashlib 支持的名称外，还支持 'crc32'、'adler32'，
+                   以及指定摘要字节数的 'blake2b-N'（例如 'blake2b-20'）
+    
+    Returns:
+        具有 update() / digest() / hexdigest() 方法的哈希对象
+    """
+    if algorithm in CHECKSUM_ALGORITHMS:
+        return ChecksumHash(algorithm)
+    if algorithm.startswith('blake2b-'):
+        return hashlib.blake2b(digest_size=int(algorithm[len('blake2b-'):]))
+    return hashlib.new(algorithm)
+
+
+def resolve_algorithm(algorithm: str, digest_size: Optional[int] = None) -> str:
+    """
+    把命令行/GUI 中选择的算法转换为 new_hash 使用的名称
+    
+    Args:
+        algorithm: ALGORITHM_CHOICES 中的一个
+        digest_size: BLAKE2b 的摘要字节数（1-64），None 表示默认的 64 字节
+    
+    Returns:
+        算法名称；'auto' 会被替换为本机上测速最快的强哈希算法
+    """
+    if algorithm == 'auto':
+        algorithm = select_fastest_algorithm()
+    if algorithm == 'blake2b' and digest_size:
+        if not 1 <= digest_size <= 64:
+            raise ValueError(f"BLAKE2b 摘要长度必须在 1 到 64 字节之间: {digest_size}")
+        if digest_size != 64:
+            algorithm = f"blake2b-{digest_size}"
+    return algorithm
+
+
+def is_checksum_algorithm(algorithm: str) -> bool:
+    """是否为只能用来预筛选的快速校验和算法"""
+    return algorithm in CHECKSUM_ALGORITHMS
+
+
+def benchmark_algorithms(algorithms: Iterable[str] = STRONG_ALGORITHMS,
+                         data_size: int = 4 * 1024 * 1024, rounds: int = 3) -> Dict[str, float]:
+    """
+    在本机上测试各个哈希算法的速度
+    
+    Args:
+        algorithms: 要测试的算法
+        data_size: 每轮哈希的数据量（字节）
+        rounds: 测试轮数，取最快的一轮
+    
+    Returns:
+        字典，键为算法名称，值为速度（MB/s）
+    """
+    data = os.urandom(data_size)
+    speeds = {}
+    for algorithm in algorithms:
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            hash_func = new_hash(algorithm)
+            hash_func.update(data)
+            hash_func.digest()
+            best = min(best, time.perf_counter() - start)
+        speeds[algorithm] = data_size / max(best, 1e-9) / (1024 * 1024)
+    return speeds
+
+
+def select_fastest_algorithm(progress_callback: Optional[Callable[[str], None]] = None) -> str:
+    """
+    测速并选择本机上最快的强哈希算法（例如带 SHA 指令扩展的 CPU 上 SHA-256 可能比 MD5 快）
+    
+    Args:
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+    
+    Returns:
+        最快的强哈希算法名称
+    """
+    report = progress_callback or print
+    speeds = benchmark_algorithms()
+    fastest = max(speeds, key=speeds.get)
+    report("哈希算法测速: " + ", ".join(f"{name.upper()} {speed:.0f} MB/s"
+                                          for name, speed in sorted(speeds.items(),
+                                                                    key=lambda item: -item[1])))
+    report(f"自动选择哈希算法: {fastest.upper()}")
+    return fastest
+
+
+def _get_read_buffer(block_size: int) -> memoryview:
+    """返回当前线程复用的读取缓冲区，避免每个数据块都分配新的 bytes 对象"""
+    buffer = getattr(_read_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != block_size:
+        buffer = memoryview(bytearray(block_size))
+        _read_buffers.buffer = buffer
+    return buffer
+
+
+def _get_compare_buffers(block_size: int) -> Tuple[bytearray, bytearray]:
+    """返回当前线程复用的一对比较缓冲区（bytearray 之间的比较使用 memcmp）"""
+    buffers = getattr(_read_buffers, 'compare_buffers', None)
+    if buffers is None or len(buffers[0]) != block_size:
+        buffers = (bytearray(block_size), bytearray(block_size))
+        _read_buffers.compare_buffers = buffers
+    return buffers
+
+
+def _readinto_full(f, buffer: bytearray) -> int:
+    """尽量读满缓冲区，返回读取的字节数（只有到达文件末尾时才会少于缓冲区大小）"""
+    view = memoryview(buffer)
+    total = 0
+    while total < len(buffer):
+        count = f.readinto(view[total:])
+        if not count:
+            break
+        total += count
+    return total
+
+
+def _update_from_file(hash_func, f, block_size: int, read_mode: str):
+    """把整个文件的内容交给哈希对象"""
+    if read_mode == 'mmap':
+        size = os.fstat(f.fileno()).st_size
+        # 空文件无法映射，小文件映射的开销比直接读取还大
+        if size > block_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hash_func.update(mapped)
+            return
+    elif read_mode == 'file_digest' and hasattr(hashlib, 'file_digest'):
+        hashlib.file_digest(f, lambda: hash_func)
+        return
+    
+    buffer = _get_read_buffer(block_size)
+    while True:
+        count = f.readinto(buffer)
+        if not count:
+            break
+        hash_func.update(buffer[:count])
+
+
+def calculate_file_digest(file_path: str, algorithm: str = 'md5', sample_size: int = 0,
+                          block_size: int = DEFAULT_BLOCK_SIZE, read_mode: str = 'readinto') -> bytes:
+    """
+    计算文件的原始摘要（二进制）
+    
+    Args:
+        file_path: 文件路径
+        algorithm: 哈希算法（见 new_hash）
+        sample_size: 采样模式下头部和尾部各读取的字节数，0 表示读取整个文件。
+                     文件不超过 2 * sample_size 字节时，结果与完整哈希值相同
+        block_size: 读取整个文件时每次读取的字节数
+        read_mode: 读取整个文件的方式（见 READ_MODES），不影响计算结果
+    
+    Returns:
+        摘要字节串
+    
+    Raises:
+        OSError: 文件无法读取
+    """
+    hash_func = new_hash(algorithm)
+    
+    # 不使用 Python 的缓冲层，readinto 直接读入复用的缓冲区
+    with open(file_path, 'rb', buffering=0) as f:
+        if sample_size > 0:
+            # 只读取头部和尾部样本
+            head = f.read(sample_size)
+            hash_func.update(head)
+            if len(head) == sample_size:
+                f.seek(0, os.SEEK_END)
+                tail_start = max(f.tell() - sample_size, sample_size)
+                f.seek(tail_start)
+                hash_func.update(f.read(sample_size))
+        else:
+            _update_from_file(hash_func, f, block_size, read_mode)
+    return hash_func.digest()
+
+
+def files_identical(path_a: str, path_b: str, block_size: int = DEFAULT_BLOCK_SIZE) -> bool:
+    """
+    逐块同步比较两个文件的内容，遇到第一个不同的数据块立即返回
+    
+    Args:
+        path_a: 第一个文件
+        path_b: 第二个文件
+        block_size: 每次从两个文件各读取的字节数
+    
+    Returns:
+        两个文件内容完全相同时返回 True
+    
+    Raises:
+        OSError: 文件无法读取
+    """
+    buffer_a, buffer_b = _get_compare_buffers(block_size)
+    with open(path_a, 'rb', buffering=0) as file_a, open(path_b, 'rb', buffering=0) as file_b:
+        if os.fstat(file_a.fileno()).st_size != os.fstat(file_b.fileno()).st_size:
+            return False
+        while True:
+            count_a = _readinto_full(file_a, buffer_a)
+            count_b = _readinto_full(file_b, buffer_b)
+            if count_a != count_b:
+                return False
+            if count_a == block_size:
+                if buffer_a != buffer_b:
+                    return False
+                continue
+            # 最后一个不完整的数据块
+            return buffer_a[:count_a] == buffer_b[:count_b]
+
+
+def _drop_page_cache(file_path: str) -> bool:
+    """尽量把文件从操作系统的页缓存中移除，使读取速度测试反映存储设备本身的速度"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def benchmark_read_modes(folder_path: str, algorithm: str = 'md5',
+                         block_size: int = DEFAULT_BLOCK_SIZE,
+                         max_bytes: int = READ_BENCHMARK_BYTES,
+                         progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
+    """
+    测试各种读取方式在某个文件夹所在存储设备上的速度
+    
+    Args:
+        folder_path: 文件夹路径，从中选取总量不超过 max_bytes 的文件
+        algorithm: 哈希算法
+        block_size: 每次读取的字节数
+        max_bytes: 最多读取的字节数
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+    
+    Returns:
+        字典，键为读取方式，值为速度（MB/s）
+    """
+    report = progress_callback or print
+    paths = []
+    total = 0
+    for record in iter_folder_files(folder_path, lambda message: None):
+        if record.size == 0:
+            continue
+        paths.append(record.path)
+        total += record.size
+        if total >= max_bytes:
+            break
+    if not paths:
+        report(f"{folder_path}: 没有可以测试的文件")
+        return {}
+    
+    speeds = {}
+    for read_mode in READ_MODES:
+        cold = all([_drop_page_cache(path) for path in paths])
+        read_bytes = 0
+        start = time.perf_counter()
+        for path in paths:
+            try:
+                calculate_file_digest(path, algorithm, 0, block_size, read_mode)
+                read_bytes += os.path.getsize(path)
+            except OSError as e:
+                report(f"读取文件 {path} 时出错: {e}")
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        speeds[read_mode] = read_bytes / elapsed / (1024 * 1024)
+        report(f"{folder_path}: {read_mode:<12} {speeds[read_mode]:8.1f} MB/s "
+               f"({len(paths)} 个文件, {read_bytes / (1024 * 1024):.1f} MB"
+               f"{'' if cold else ', 可能命中页缓存'})")
+    return speeds
+
+
+def _scan_directory(directory: str, report: Callable[[str], None],
+                    dir_states: Optional[HashCache] = None) -> Tuple[List[str], List[FileRecord]]:
+    """
+    读取一个目录的直接子项
+    
+    目录项的类型直接来自 DirEntry，不需要额外的 stat；每个文件只 stat 一次。
+    不会进入指向目录的符号链接。
+    
+    提供 dir_states 时（--trust-dir-mtime），先 stat 目录本身：修改时间与上次保存的
+    相同就直接返回上次的内容，不再读取目录，也不再 stat 其中的文件；否则读取目录并
+    保存结果。目录的修改时间只在增加、删除或重命名子项时改变，原地修改的文件不会被
+    发现，所以只适合文件写入后不再修改的文件夹（例如备份）。
+    
+    Returns:
+        元组：(子目录路径列表, 文件记录列表)
+    """
+    sub_dirs, records = [], []
+    dir_mtime_ns = None
+    if dir_states is not None:
+        try:
+            dir_mtime_ns = os.stat(directory).st_mtime_ns
+            state = dir_states.get_directory(directory, dir_mtime_ns)
+        except OSError:
+            state = None
+        if state is not None:
+            sub_dir_names, files = state
+            sub_dirs = [os.path.join(directory, name) for name in sub_dir_names]
+            records = [FileRecord(os.path.join(directory, name), *metadata) for name, *metadata in files]
+            return sub_dirs, records
+    
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError as e:
+        report(f"读取文件夹 {directory} 时出错: {e}")
+        return sub_dirs, records
+    
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            elif entry.is_file():
+                entry_stat = entry.stat()
+                records.append(FileRecord(entry.path, entry_stat.st_size, entry_stat.st_mtime_ns,
+                                          entry_stat.st_ino, entry_stat.st_dev, entry_stat.st_nlink))
+        except OSError as e:
+            report(f"读取文件信息 {entry.path} 时出错: {e}")
+            # 这次没有读全的目录不保存
+            dir_mtime_ns = None
+    if dir_mtime_ns is not None:
+        dir_states.put_directory(directory, dir_mtime_ns,
+                                 [os.path.basename(path) for path in sub_dirs],
+                                 [(os.path.basename(record.path),) + tuple(record[1:])
+                                  for record in records])
+    return sub_dirs, records
+
+
+def iter_folder_files(folder_path: str,
+                      progress_callback: Optional[Callable[[str], None]] = None) -> Iterator[FileRecord]:
+    """
+    递归遍历文件夹中的所有普通文件（单线程，基于 os.scandir 的迭代遍历）
+    
+    Args:
+        folder_path: 文件夹路径
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+    
+    Yields:
+        FileRecord
+    """
+    report = progress_callback or print
+    folder_path = os.fspath(folder_path)
+    
+    if not os.path.isdir(folder_path):
+        report(f"错误：文件夹 {folder_path} 不存在")
+        return
+    
+    report(f"正在扫描文件夹: {folder_path}")
+    
+    pending_dirs = [folder_path]
+    while pending_dirs:
+        sub_dirs, records = _scan_directory(pending_dirs.pop(), report)
+        yield from records
+        # 逆序入栈，保持按目录项顺序深度优先遍历
+        pending_dirs.extend(reversed(sub_dirs))
+
+
+class ParallelFolderWalker:
+    """
+    多线程并行遍历一个或多个文件夹
+    
+    每个遍历线程有自己的目录双端队列：新发现的子目录压入自己队列的尾部并优先
+    处理（深度优先，局部性好），自己的队列空了就从其他线程队列的头部"窃取"
+    较大的子树。多个根目录同时遍历，发现的文件通过回调立即交给下游处理。
+    扫描暂停时遍历线程在下一个目录之前等待；取消后剩下的目录不再读取。
+    """
+    
+    def __init__(self, folders: List[str], workers: int = DEFAULT_WALK_WORKERS,
+                 progress_callback: Optional[Callable[[str], None]] = None,
+                 dir_states: Optional[HashCache] = None, control: Optional[ScanControl] = None):
+        """
+        Args:
+            folders: 要遍历的文件夹列表，回调中用它们的序号区分
+            workers: 遍历线程数
+            progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+            dir_states: 保存目录状态的缓存，修改时间未变化的目录直接复用上次的内容
+                        （见 _scan_directory）
+            control: 暂停和取消遍历
+        """
+        self.folders = [os.fspath(folder) for folder in folders]
+        self.workers = max(1, workers)
+        self.report = progress_callback or print
+        self.dir_states = dir_states
+        self.control = control
+        self._deques = [deque() for _ in range(self.workers)]
+        self._outstanding = 0
+        self._condition = threading.Condition()
+    
+    def run(self, on_file: Callable[[int, FileRecord], None]):
+        """
+        遍历所有文件夹，阻塞直到全部完成
+        
+        Args:
+            on_file: 每发现一个文件就调用 on_file(文件夹序号, 文件记录)，可能在任意遍历线程中调用
+        """
+        for index, folder in enumerate(self.folders):
+            if not os.path.isdir(folder):
+                self.report(f"错误：文件夹 {folder} 不存在")
+                continue
+            self.report(f"正在扫描文件夹: {folder}")
+            self._deques[index % self.workers].append((index, folder))
+            self._outstanding += 1
+        
+        threads = [threading.Thread(target=self._worker, args=(number, on_file), daemon=True)
+                   for number in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def _steal(self, number: int):
+        """从其他线程队列的头部取一个目录（deque 的 pop/popleft 是线程安全的）"""
+        for offset in range(1, self.workers):
+            try:
+                return self._deques[(number + offset) % self.workers].popleft()
+            except IndexError:
+                continue
+        return None
+    
+    def _worker(self, number: int, on_file: Callable[[int, FileRecord], None]):
+        own = self._deques[number]
+        while True:
+            try:
+                item = own.pop()
+            except IndexError:
+                item = self._steal(number)
+            
+            if item is None:
+                with self._condition:
+                    if self._outstanding == 0:
+                        self._condition.notify_all()
+                        return
+                    self._condition.wait(0.05)
+                continue
+            
+            index, directory = item
+            if self.control is not None and not self.control.checkpoint():
+                # 已取消：剩下的目录只出队不读取，很快全部结束
+                sub_dirs, records = [], []
+            else:
+                sub_dirs, records = _scan_directory(directory, self.report, self.dir_states)
+            if sub_dirs:
+                with self._condition:
+                    self._outstanding += len(sub_dirs)
+                own.extend((index, sub_dir) for sub_dir in reversed(sub_dirs))
+            for record in records:
+                on_file(index, record)
+            
+            with self._condition:
+                self._outstanding -= 1
+                if sub_dirs or self._outstanding == 0:
+                    self._condition.notify_all()
+
+
+def ordered_parallel_map(func: Callable[[Any], Any], items: Iterable[Any], workers: int = 1,
+                         max_pending: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+    """
+    在线程池中并行执行 func，并按输入顺序返回结果
+    
+    items 可以是一个惰性生成器（例如目录遍历），同时最多只有 max_pending 个任务
+    在排队或执行，相当于生产者和工作线程之间的有界队列。结果顺序与线程数无关。
+    
+    Args:
+        func: 对每个元素执行的函数
+        items: 输入元素
+        workers: 工作线程数，1 表示在当前线程中顺序执行
+        max_pending: 最多同时提交的任务数（默认 workers * 4）
+    
+    Yields:
+        元组：(输入元素, 结果或 func 抛出的异常)
+    """
+    if workers <= 1:
+        for item in items:
+            try:
+                yield item, func(item)
+            except Exception as e:
+                yield item, e
+        return
+    
+    max_pending = max_pending or workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= max_pending:
+                item, future = pending.popleft()
+                yield item, future.exception() or future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.exception() or future.result()
+
+
+def watch_parallel_map(func: Callable[[str], Any], watcher: FolderWatcher, workers: int = 1,
+                       max_pending: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    对监视器送来的每个文件并行执行 func，并按到达顺序返回结果
+    
+    与 ordered_parallel_map 不同，这里每个结果一完成就立即返回，不等待排队的任务
+    凑满 max_pending 个；监视器空闲时也会定期检查已完成的任务。
+    
+    Args:
+        func: 对每个文件执行的函数
+        watcher: 已启动的 FolderWatcher
+        workers: 工作线程数，1 表示在当前线程中顺序执行
+        max_pending: 最多同时提交的任务数（默认 workers * 4）
+    
+    Yields:
+        元组：(文件路径, 结果或 func 抛出的异常)
+    """
+    if workers <= 1:
+        yield from ordered_parallel_map(func, watcher)
+        return
+    
+    max_pending = max_pending or workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while pending or not watcher.stopped:
+            while pending and pending[0][1].done():
+                item, future = pending.popleft()
+                yield item, future.exception() or future.result()
+            if len(pending) >= max_pending:
+                wait([pending[0][1]])
+                continue
+            item = watcher.get(WATCH_RESULT_POLL_INTERVAL if pending else 0.5)
+            if item is not None:
+                pending.append((item, executor.submit(func, item)))
+
+
+def _hash_file_batch(file_paths: List[str], algorithm: str, sample_size: int,
+                     block_size: int = DEFAULT_BLOCK_SIZE, read_mode: str = 'readinto') -> List[Any]:
+    """
+    进程池工作函数：计算一批文件的原始摘要
+    
+    Returns:
+        与 file_paths 一一对应的列表，元素为摘要字节串，读取失败时为错误信息字符串
+    """
+    results = []
+    for file_path in file_paths:
+        try:
+            results.append(calculate_file_digest(file_path, algorithm, sample_size,
+                                                 block_size, read_mode))
+        except OSError as e:
+            results.append(str(e))
+    return results
+
+
+def _compare_file_batch(file_pairs: List[Tuple[str, str]], block_size: int) -> List[Any]:
+    """
+    工作函数：逐字节比较一批 (目标文件, 源文件)
+    
+    Returns:
+        与 file_pairs 一一对应的列表，元素为比较结果（bool），读取失败时为错误信息字符串
+    """
+    results = []
+    for target_path, source_path in file_pairs:
+        try:
+            results.append(files_identical(target_path, source_path, block_size))
+        except OSError as e:
+            results.append(str(e))
+    return results
+
+
+def _folder_list(folders: Any) -> List[str]:
+    """一个文件夹或文件夹列表 → 文件夹列表"""
+    if isinstance(folders, (str, os.PathLike)):
+        return [os.fspath(folders)]
+    return [os.fspath(folder) for folder in folders]
+
+
+def find_overlapping_folders(folders: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """
+    检查文件夹之间是否相同或互相包含（同一个文件会同时出现在两个文件夹中，被当成
+    自己的重复文件删除）
+    
+    Returns:
+        第一对相同或互相包含的文件夹，没有时返回 None
+    """
+    resolved = [(folder, os.path.normcase(os.path.realpath(folder))) for folder in folders]
+    for number, (folder, path) in enumerate(resolved):
+        for other, other_path in resolved[number + 1:]:
+            try:
+                common = os.path.commonpath([path, other_path])
+            except ValueError:
+                # Windows 上不同驱动器的路径
+                continue
+            if common in (path, other_path):
+                return folder, other
+    return None
+
+
+class DuplicateScanner:
+    """
+    流水线式重复文件扫描
+    
+    源文件夹和目标文件夹由 ParallelFolderWalker 同时遍历，遍历到的文件立即进入
+    大小 → 头尾样本 → 完整哈希值 的逐级筛选：某个大小一旦在两边都出现，这个大小的
+    文件马上开始计算哈希值，遍历和哈希计算同时进行，而不是先后扫描两个文件夹。
+    使用快速校验和算法（crc32/adler32）时，校验和相同的文件还要经过强哈希算法确认。
+    
+    scan() 也可以一次比较多个源文件夹和多个目标文件夹：所有文件夹只遍历一次，
+    共用同一套索引，每个文件最多计算一次哈希值。文件夹按优先级排列（所有源文件夹
+    在前，然后是目标文件夹，各自按给出的顺序），内容相同的文件保留优先级最高的一份；
+    目标文件夹中的文件只要在优先级更高的文件夹中出现就是重复文件，源文件夹中的文件
+    从不删除，同一个文件夹内部的重复文件也不处理。
+    
+    dedupe() 在一个文件夹内部查找重复文件，使用同样的逐级筛选，每组按保留策略
+    留下一份。
+    
+    verify='bytes' 时，哈希值相同的目标文件还要与一个匹配的源文件逐字节比较；
+    某个大小在源文件夹中只有一个文件时，这个大小的目标文件不计算哈希值，
+    遍历结束后直接与该源文件比较（结果的键为 'size:<大小>'）。
+    
+    所有状态只在调用 scan() 的协调线程中修改；遍历线程和哈希工作线程通过事件队列
+    把结果交回协调线程。
+    
+    扫描可以通过 control（ScanControl）暂停、继续和取消：协调线程同时最多向工作线程
+    提交 workers * SUBMIT_WINDOW 批文件，暂停时不再提交，已经提交的读取完成后就不再
+    读取任何文件。取消时遍历停止，排队的批次丢弃，已经提交的批次读取完成后正常处理；
+    结果只包含取消前已经确认的重复文件（各阶段摘要都已算完，逐字节校验时已比较过），
+    不完整的遍历也不会用来清理缓存。
+    
+    on_duplicate 回调在扫描过程中逐个报告已经确认的重复文件（界面可以边扫描边显示），
+    判断规则与 scan() 的结果相同；与保留的文件是同一个 inode 的硬链接通常不报告，
+    但个别情况（例如对应的源文件在之后才遍历到）只有最终结果才能排除，所以扫描结束后
+    仍以 scan() 的返回值为准。dedupe() 要等所有文件算完才能按保留策略确定每组保留
+    哪一份，不报告。
+    """
+    
+    def __init__(self, algorithm: str = 'md5', sample_size: int = DEFAULT_SAMPLE_SIZE,
+                 cache: Optional[HashCache] = None, workers: int = 1, backend: str = 'thread',
+                 walk_workers: int = DEFAULT_WALK_WORKERS,
+                 confirm_algorithm: str = DEFAULT_CONFIRM_ALGORITHM,
+                 block_size: int = DEFAULT_BLOCK_SIZE, read_mode: str = 'readinto',
+                 verify: str = 'none', trust_dir_mtime: bool = False,
+                 progress_callback: Optional[Callable[[str], None]] = None,
+                 progress: Optional[ProgressCounters] = None,
+                 control: Optional[ScanControl] = None,
+                 on_duplicate: Optional[Callable[[str, FileRecord], None]] = None):
+        """
+        Args:
+            algorithm: 哈希算法（见 new_hash），'auto' 表示测速选择最快的强哈希算法
+            sample_size: 头部和尾部各采样的字节数，0 表示不采样，直接计算完整哈希值
+            cache: 哈希值缓存
+            workers: 并行计算哈希值的线程数或进程数
+            backend: 哈希计算后端（'thread' 或 'process'）
+            walk_workers: 并行遍历目录的线程数
+            confirm_algorithm: algorithm 为快速校验和时用来确认匹配结果的强哈希算法
+            block_size: 读取整个文件时每次读取的字节数
+            read_mode: 读取整个文件的方式（见 READ_MODES）
+            verify: 校验方式（见 VERIFY_MODES）
+            trust_dir_mtime: 在 cache 中保存每个目录的内容，修改时间没有变化的目录直接复用
+                             上次的文件列表，不再遍历（见 _scan_directory）
+            progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）；
+                               逐个文件的进度不再通过它报告，而是记录在 progress 中
+            progress: 进度计数器，界面或命令行按固定频率读取（默认新建一个）
+            control: 暂停、继续和取消扫描（默认新建一个，不会被暂停或取消）
+            on_duplicate: 每确认一个重复文件就调用 on_duplicate(哈希值, 目标文件记录)，
+                          在协调线程（stream() 时为调用者的线程）中调用，应尽快返回
+        """
+        self.report = progress_callback or print
+        self.progress = progress or ProgressCounters()
+        self.control = control or ScanControl()
+        self.on_duplicate = on_duplicate
+        if trust_dir_mtime and cache is None:
+            raise ValueError("trust_dir_mtime 需要哈希值缓存")
+        self._dir_states = cache if trust_dir_mtime else None
+        if algorithm == 'auto':
+            algorithm = select_fastest_algorithm(self.report)
+        if confirm_algorithm == 'auto':
+            confirm_algorithm = select_fastest_algorithm(self.report)
+        if is_checksum_algorithm(confirm_algorithm):
+            raise ValueError(f"确认算法必须是强哈希算法: {confirm_algorithm}")
+        self.algorithm = algorithm
+        self.sample_size = sample_size
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.walk_workers = walk_workers
+        self.block_size = block_size
+        self.read_mode = read_mode
+        self.verify = verify
+        self.confirm_algorithm = confirm_algorithm
+        self.batch_size = PROCESS_BATCH_SIZE if backend == 'process' else 1
+        # match_file 和 build_catalog 在多个工作线程中计算摘要时，(阶段, inode) → 摘要，
+        # 同一个文件的硬链接只读取一次（scan 和 dedupe 使用 _run 中的 _link_digests）
+        self._link_hashes = {}
+        self._set_stages(algorithm, sample_size)
+    
+    def _set_stages(self, algorithm: str, sample_size: int):
+        """
+        筛选阶段：(算法, 采样字节数)。某一阶段的 (大小, 摘要) 在两边都出现时
+        才进入下一阶段，最后一个阶段的摘要就是最终比较用的哈希值
+        """
+        self.algorithm = algorithm
+        self.sample_size = sample_size
+        self.stages = []
+        if sample_size > 0:
+            self.stages.append((algorithm, sample_size))
+        self.stages.append((algorithm, 0))
+        if is_checksum_algorithm(algorithm):
+            self.stages.append((self.confirm_algorithm, 0))
+        self._full_stage = 1 if sample_size > 0 else 0
+    
+    @property
+    def cancelled(self) -> bool:
+        """扫描是否已被取消（此时结果只包含取消前已经确认的部分）"""
+        return self.control.cancelled
+    
+    @property
+    def result_algorithm(self) -> str:
+        """结果中哈希值的算法：最后一个筛选阶段的算法（载入目录索引或清单后以它们为准）"""
+        return self.stages[-1][0]
+    
+    def scan(self, source_folder: Any, target_folder: Any) -> Dict[str, List[FileRecord]]:
+        """
+        扫描源文件夹和目标文件夹
+        
+        Args:
+            source_folder: 源文件夹，或按优先级排列的源文件夹列表
+            target_folder: 目标文件夹，或按优先级排列的目标文件夹列表
+        
+        Returns:
+            字典，键为哈希值，值为目标文件夹中具有该哈希值的重复文件记录列表（按路径排序）；
+            每组保留的文件（优先级最高的一份）保存在 self.kept 中，键相同
+        """
+        sources = _folder_list(source_folder)
+        targets = _folder_list(target_folder)
+        self._run(sources + targets, len(sources))
+        
+        trees = range(len(self._folders))
+        self.kept = {}
+        if self.verify == 'bytes':
+            matches = self._verified
+            for file_hash, records in matches.items():
+                if file_hash.startswith('size:'):
+                    size = records[0].size
+                    self.kept[file_hash] = self._sizes[self._single_source_keeper[size]][size][0]
+                else:
+                    self.kept[file_hash] = self._verify_sources[(records[0].size, file_hash)][1]
+        else:
+            matches = {}
+            final_keys = self._keys[-1]
+            for key in self._common_keys[-1]:
+                present = [tree for tree in trees if key in final_keys[tree]]
+                keeper_tree = present[0]
+                duplicates = [record for tree in present[1:] if tree >= self._first_target
+                              for record in final_keys[tree][key]]
+                if duplicates:
+                    matches[key[1]] = duplicates
+                    self.kept[key[1]] = min(final_keys[keeper_tree][key],
+                                            key=lambda record: record.path)
+        
+        def originals(file_hash, record):
+            """保留的文件，以及所有源文件夹中内容相同的文件"""
+            kept = [self.kept[file_hash]]
+            if file_hash.startswith('size:'):
+                return kept
+            key = (record.size, file_hash)
+            return kept + [each for tree in range(self._first_target)
+                           for each in self._keys[-1][tree].get(key, ())]
+        
+        matches = self._split_hardlinks(matches, originals)
+        matches = {file_hash: sorted(records, key=lambda record: record.path)
+                   for file_hash, records in matches.items()}
+        return dict(sorted(matches.items(), key=lambda item: item[1][0].path))
+    
+    def dedupe(self, folder: str, keep: str = 'shortest',
+               prefer: Iterable[str] = ()) -> Dict[str, List[FileRecord]]:
+        """
+        查找一个文件夹内部的重复文件
+        
+        某个大小在文件夹中出现两次以上时，这个大小的文件才计算哈希值，每个候选文件
+        每个阶段只读取一次。每组内容相同的文件保留一份：优先保留位于 prefer 中
+        靠前的子文件夹里的文件，其次按 keep 策略（见 KEEP_POLICIES），最后按路径。
+        verify='bytes' 时其余文件还要与保留的文件逐字节比较，不一致的不算重复。
+        
+        Args:
+            folder: 文件夹路径
+            keep: 保留策略，'shortest' 保留路径最短的文件，'oldest' 保留修改时间最早的文件
+            prefer: 优先保留的子文件夹（相对于 folder 或绝对路径），按优先级排列
+        
+        Returns:
+            字典，键为哈希值，值为除保留文件以外的重复文件记录列表（按路径排序）；
+            每组保留的文件保存在 self.kept 中，键相同
+        """
+        if keep not in KEEP_POLICIES:
+            raise ValueError(f"未知的保留策略: {keep}")
+        folder = os.fspath(folder)
+        preferred = [os.path.join(os.path.abspath(folder), subdir) for subdir in prefer]
+        
+        def keep_order(record):
+            path = os.path.abspath(record.path)
+            rank = next((number for number, subdir in enumerate(preferred)
+                         if path.startswith(subdir.rstrip(os.sep) + os.sep)), len(preferred))
+            policy = record.mtime_ns if keep == 'oldest' else len(record.path)
+            return rank, policy, record.path
+        
+        self._run([folder], 0, within_folder=True)
+        
+        self.kept = {}
+        matches = {}
+        final_keys = self._keys[-1][0]
+        for key in self._common_keys[-1]:
+            records = sorted(final_keys[key], key=keep_order)
+            self.kept[key[1]] = records[0]
+            matches[key[1]] = records[1:]
+        matches = self._split_hardlinks(matches, lambda file_hash, _: [self.kept[file_hash]])
+        pairs = [(record, self.kept[file_hash], file_hash)
+                 for file_hash, records in matches.items() for record in records]
+        
+        if self.verify == 'bytes' and pairs:
+            self.report(f"逐字节比较 {len(pairs)} 个文件...")
+            self.progress.set_phase("逐字节比较")
+            self.progress.scheduled(sum(2 * record.size for record, _, _ in pairs), len(pairs))
+            matches = {}
+            for (record, kept, file_hash), identical in ordered_parallel_map(
+                    lambda pair: files_identical(pair[0].path, pair[1].path, self.block_size),
+                    self.control.iterate(pairs), self.workers):
+                self.progress.done(2 * record.size)
+                if isinstance(identical, Exception):
+                    self.report(f"比较文件 {record.path} 时出错: {identical}")
+                    continue
+                self._bytes_read += 2 * record.size
+                if identical:
+                    matches.setdefault(file_hash, []).append(record)
+                else:
+                    self.report(f"哈希值相同但逐字节比较不一致，跳过: {record.path}")
+            self.progress.finish()
+        
+        matches = {file_hash: sorted(records, key=lambda record: record.path)
+                   for file_hash, records in matches.items() if records}
+        return dict(sorted(matches.items(), key=lambda item: self.kept[item[0]].path))
+    
+    def _split_hardlinks(self, matches: Dict[str, List[FileRecord]],
+                         originals: Callable[[str, FileRecord], List[FileRecord]]
+                         ) -> Dict[str, List[FileRecord]]:
+        """
+        把与保留的文件（或源文件）是同一个 inode 的重复文件移到 self.hardlinks：
+        删除这样的链接不会释放任何空间
+        
+        Args:
+            matches: 哈希值 → 重复文件记录列表
+            originals: (哈希值, 该组的一个重复文件) → 不会被删除的文件记录
+        
+        Returns:
+            去掉硬链接之后的 matches（没有剩余文件的组也去掉）
+        """
+        result = {}
+        for file_hash, records in matches.items():
+            inodes = {(each.dev, each.ino): each for each in originals(file_hash, records[0]) if each.ino}
+            remaining = []
+            for record in records:
+                original = inodes.get((record.dev, record.ino)) if record.ino else None
+                if original is None:
+                    remaining.append(record)
+                else:
+                    self.hardlinks.append((record, original))
+            if remaining:
+                result[file_hash] = remaining
+        return result
+    
+    def _run(self, folders: List[str], first_target: int, within_folder: bool = False):
+        """
+        遍历文件夹并运行逐级筛选流水线，结果留在 self._keys 等状态中
+        
+        Args:
+            folders: 按优先级排列的文件夹
+            first_target: 第一个目标文件夹的序号
+            within_folder: 在唯一的文件夹内部查找重复文件（同一个键出现两次以上就是候选）
+        """
+        self._folders = folders
+        self._first_target = first_target
+        self._within_folder = within_folder
+        # 单文件夹去重的逐字节比较在确定保留文件之后进行，不在流水线中
+        self._compare_inline = self.verify == 'bytes' and not within_folder
+        trees = range(len(folders))
+        # 每个文件夹的 大小 → 记录；每个阶段每个文件夹的 (大小, 摘要) → 记录
+        self._sizes = [{} for _ in trees]
+        self._common_sizes = set()
+        # verify='bytes' 时只有一个参考文件的大小：大小 → (参考文件所在文件夹, 目标文件夹)，
+        # 遍历结束后直接比较内容
+        self._single_source_sizes = {}
+        self._single_source_keeper = {}
+        self._verify_sources = {}
+        self._verified = {}
+        # 已经报告过重复文件的 (大小, 哈希值) → 当前保留的文件所在的文件夹（见 _announce）
+        self._live_keepers = {}
+        self._compare_batch = []
+        self._keys = [[{} for _ in trees] for _ in self.stages]
+        self._common_keys = [set() for _ in self.stages]
+        self._candidates = [0 for _ in trees]
+        self._batches = [[] for _ in self.stages]
+        # 等待提交给工作线程的批次：(完成时放入事件队列的事件, 函数, 参数)
+        self._ready = deque()
+        # 每个阶段 inode → 摘要，或者等待第一个链接算完的 [(文件夹, 记录)]；只记录有多个硬链接的文件
+        self._link_digests = [{} for _ in self.stages]
+        self.hardlinks = []
+        self._outstanding = 0
+        self._bytes_read = 0
+        self._events = queue.Queue()
+        self.progress.reset("扫描文件夹")
+        start = time.perf_counter()
+        
+        walker = ParallelFolderWalker(folders, self.walk_workers, self.report, self._dir_states,
+                                      self.control)
+        walk_slots = threading.Semaphore(WALK_QUEUE_SIZE)
+        
+        def on_file(tree, record):
+            walk_slots.acquire()
+            self._events.put(('file', tree, record))
+        
+        def walk():
+            try:
+                walker.run(on_file)
+            finally:
+                self._events.put(('walk_done',))
+        
+        executor_class = ProcessPoolExecutor if self.backend == 'process' else ThreadPoolExecutor
+        with executor_class(max_workers=self.workers) as executor:
+            self._executor = executor
+            threading.Thread(target=walk, daemon=True).start()
+            walking = True
+            cancelling = False
+            # 取消后只等待遍历结束和已经提交的批次完成，排队和未满的批次不再处理
+            while walking or self._outstanding or not cancelling and (
+                    self._ready or any(self._batches) or self._compare_batch):
+                if not cancelling and self.control.cancelled:
+                    cancelling = True
+                    self._ready.clear()
+                    self.report("正在取消扫描，等待正在读取的文件完成...")
+                try:
+                    event = self._events.get_nowait()
+                except queue.Empty:
+                    # 协调线程空闲时把未满的批次交给工作线程，避免它们等待
+                    if not cancelling and (any(self._batches) or self._compare_batch):
+                        self._flush_all()
+                        continue
+                    try:
+                        # 定期醒来，暂停的扫描继续后重新开始提交
+                        event = self._events.get(timeout=CONTROL_POLL_INTERVAL)
+                    except queue.Empty:
+                        self._dispatch()
+                        continue
+                
+                if event[0] == 'file':
+                    walk_slots.release()
+                    if not cancelling:
+                        self._on_file(event[1], event[2])
+                elif event[0] == 'hashed':
+                    self._outstanding -= 1
+                    self._on_batch_done(*event[1:])
+                    self._dispatch()
+                elif event[0] == 'compared':
+                    self._outstanding -= 1
+                    self._on_compare_done(*event[1:])
+                    self._dispatch()
+                elif event[0] == 'walk_done':
+                    walking = False
+                    if not cancelling:
+                        self.progress.finish_walk()
+                        self._compare_single_source_sizes()
+                    self._report_walk_summary()
+        
+        self.progress.finish()
+        if self.cancelled:
+            self.report("扫描已取消，结果只包含取消前已经确认的重复文件")
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.report(f"读取文件内容 {self._bytes_read / (1024 * 1024):.1f} MB, "
+                    f"{self._bytes_read / elapsed / (1024 * 1024):.1f} MB/s "
+                    f"(读取方式 {self.read_mode}, 块大小 {self.block_size // 1024} KB)")
+        
+        # 取消时遍历不完整，不能据此删除缓存中"已经不存在"的文件
+        if self.cache is not None and not self.cancelled:
+            for folder, file_sizes in zip(folders, self._sizes):
+                self.cache.prune_missing(folder, (record.path for records in file_sizes.values()
+                                                  for record in records))
+    
+    def stream(self, source_folder: Any,
+               target_folder: str) -> Iterator[Tuple[str, FileRecord, FileRecord]]:
+        """
+        流式比较：先建立源文件夹的索引，再逐个处理目标文件，确认重复就立即返回
+        
+        source_folder 也可以是目录索引文件（见 build_catalog）或已经载入的 CompactIndex，
+        此时源文件的摘要直接从索引中读取，哈希算法和采样字节数以索引为准；
+        或者是校验和清单（文件路径、路径列表或 ManifestIndex），此时完全不读取源文件，
+        目标文件全部按清单的算法计算完整哈希值（清单中没有文件大小，无法按大小预筛选）。
+        
+        内存占用只取决于源文件夹的索引（CompactIndex，以及按需计算的源文件原始摘要，
+        每个阶段一个定长字节数组）；目标文件处理完即丢弃。源文件的摘要在第一次出现
+        同样大小的目标文件时才计算，并且每个源文件每个阶段只计算一次。
+        哈希计算始终使用线程池。
+        
+        Yields:
+            元组：(哈希值, 目标文件记录, 匹配的源文件记录)，按目标文件的遍历顺序
+        """
+        self.load_source(source_folder)
+        if self.cancelled:
+            return
+        index = self._source_index
+        if self._manifest is not None:
+            self.report("\n2. 计算目标文件哈希值并与清单比较...")
+        else:
+            self.report("\n2. 逐个比较目标文件...")
+        
+        def candidates():
+            for record in self._iter_walk(target_folder):
+                if self._manifest is not None or index.size_range(record.size):
+                    self.progress.scheduled(record.size)
+                    yield record
+        
+        self.progress.reset("比较目标文件")
+        start = time.perf_counter()
+        for record, result in ordered_parallel_map(self.match_file, candidates(), self.workers):
+            self.progress.done(record.size)
+            if isinstance(result, Exception):
+                self.report(f"处理文件 {record.path} 时出错: {result}")
+            elif result is not None and same_file(record, result[1]):
+                self.hardlinks.append((record, result[1]))
+            elif result is not None:
+                if self.on_duplicate is not None:
+                    self.on_duplicate(result[0], record)
+                yield result[0], record, result[1]
+        self.progress.finish()
+        if self.cancelled:
+            self.report("扫描已取消，只比较了取消前已经开始处理的目标文件")
+        
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.report(f"读取文件内容 {self._bytes_read / (1024 * 1024):.1f} MB, "
+                    f"{self._bytes_read / elapsed / (1024 * 1024):.1f} MB/s "
+                    f"(读取方式 {self.read_mode}, 块大小 {self.block_size // 1024} KB)")
+        if self._source_states is not None:
+            self.report(self.source_summary())
+    
+    def source_summary(self) -> str:
+        """源文件夹索引的内存占用（包括已经计算的源文件摘要）"""
+        if self._source_states is None:
+            return self._source_index.summary()
+        return self._source_index.summary(sum(len(digests) + len(states) for digests, states
+                                              in zip(self._source_digests, self._source_states)))
+    
+    def load_source(self, source_folder: Any):
+        """
+        建立（或载入）源文件夹的索引，之后可以用 match_file 逐个比较目标文件
+        
+        source_folder 可以是文件夹、目录索引或校验和清单，见 stream。
+        """
+        self._source_lock = threading.Lock()
+        self._source_pending = {}
+        self._link_hashes = {}
+        self.hardlinks = []
+        self._bytes_read = 0
+        self._manifest = None
+        self._source_index = None
+        self._source_states = None
+        
+        if is_manifest(source_folder):
+            self._load_manifest(source_folder)
+            return
+        if is_catalog(source_folder):
+            self._source_index = index = self._use_catalog(source_folder)
+            # 源文件的摘要已经全部保存在索引中
+            self._source_digests = ([index.samples] if self.sample_size > 0 else []) + [index.digests]
+            self._source_states = None
+        else:
+            self._source_index = index = CompactIndex()
+            
+            def on_source_file(_, record):
+                with self._source_lock:
+                    index.add(record)
+                self.progress.found(record.size)
+            
+            self.report("\n1. 建立源文件夹索引...")
+            self.progress.reset("建立源文件夹索引")
+            ParallelFolderWalker([source_folder], self.walk_workers, self.report,
+                                 self._dir_states, self.control).run(on_source_file)
+            self.progress.finish()
+            if self.cancelled:
+                self.report("扫描已取消，源文件夹索引不完整")
+            index.finalize()
+            self.report(f"源文件夹共有 {len(index)} 个文件, {index.size_count()} 种大小")
+            self.report(index.summary())
+            if self.cache is not None and not self.cancelled:
+                self.cache.prune_missing(source_folder, (index.path(number) for number in range(len(index))))
+            
+            # 每个阶段的源文件原始摘要：state 为 0 未计算，1 已计算，2 读取失败
+            self._source_digests = [bytearray(len(index) * new_hash(algorithm).digest_size)
+                                    for algorithm, _ in self.stages]
+            self._source_states = [bytearray(len(index)) for _ in self.stages]
+        self._source_digest_sizes = [new_hash(algorithm).digest_size for algorithm, _ in self.stages]
+    
+    def _load_manifest(self, manifest: Any):
+        """载入校验和清单：源文件只有路径和哈希值，目标文件全部按清单的算法计算完整哈希值"""
+        if not isinstance(manifest, ManifestIndex):
+            manifest = load_manifests([manifest] if isinstance(manifest, str) else manifest, self.report)
+        self._manifest = manifest
+        self._set_stages(manifest.algorithm, 0)
+        self.report(f"\n1. 载入校验和清单: {len(manifest.files)} 个清单, {len(manifest)} 个文件, "
+                    f"哈希算法 {manifest.algorithm.upper()}")
+        if self.verify == 'bytes':
+            self.report("校验和清单中的源文件无法读取，跳过逐字节校验")
+    
+    def match_file(self, target: FileRecord) -> Optional[Tuple[str, FileRecord]]:
+        """
+        比较一个目标文件与 load_source 载入的源文件（可以在多个线程中同时调用）
+        
+        Returns:
+            (哈希值, 匹配的源文件记录)；没有重复时返回 None。与清单比较时源文件记录中
+            的大小取目标文件的大小；目标文件是源文件的硬链接时哈希值为空字符串
+        
+        Raises:
+            OSError: 目标文件无法读取
+        """
+        if self._manifest is not None:
+            file_hash = self._stage_digest(0, target)
+            paths = self._manifest.hashes.get(file_hash)
+            return (file_hash, FileRecord(paths[0], target.size, 0, 0, 0)) if paths else None
+        if not self._source_index.size_range(target.size):
+            return None
+        return self._match_target(target)
+    
+    def _use_catalog(self, catalog: Any) -> CompactIndex:
+        """载入目录索引，并改用索引的哈希算法和采样字节数"""
+        start = time.perf_counter()
+        index = catalog if isinstance(catalog, CompactIndex) else CompactIndex.load(catalog)
+        algorithm = index.metadata['algorithm']
+        sample_size = index.metadata.get('sample_size', 0)
+        self._set_stages(algorithm, sample_size)
+        self.report(f"\n1. 载入目录索引: {index.metadata.get('source', '')} "
+                    f"({len(index)} 个文件, {(time.perf_counter() - start) * 1000:.0f} ms)")
+        self.report(f"使用目录索引的哈希算法 {algorithm.upper()}，采样 {sample_size} 字节")
+        self.report(index.summary())
+        return index
+    
+    def build_catalog(self, source_folder: str) -> CompactIndex:
+        """
+        扫描源文件夹，计算每个文件的完整摘要（大文件还有头尾样本摘要），生成目录索引
+        
+        Returns:
+            排好序的 CompactIndex，metadata 中记录哈希算法、采样字节数和源文件夹；
+            扫描被取消时只包含取消前已经处理的文件
+        
+        Raises:
+            ValueError: 哈希算法是快速校验和（目录索引中的摘要必须足以确认重复）
+        """
+        if is_checksum_algorithm(self.algorithm):
+            raise ValueError(f"目录索引必须使用强哈希算法: {self.algorithm}")
+        self._source_lock = threading.Lock()
+        self._link_hashes = {}
+        self._bytes_read = 0
+        # 索引中保存绝对路径，在其他工作目录下使用索引时路径仍然有效
+        source = os.path.abspath(source_folder)
+        digest_size = new_hash(self.algorithm).digest_size
+        index = CompactIndex(digest_size, {
+            'algorithm': self.algorithm,
+            'sample_size': self.sample_size,
+            'source': source,
+            'created': int(time.time()),
+        })
+        no_sample = bytes(digest_size)
+        
+        def digests(record):
+            sample = None
+            if self.sample_size > 0:
+                sample = (bytes.fromhex(self._stage_digest(0, record))
+                          if record.size > 2 * self.sample_size else no_sample)
+            return bytes.fromhex(self._stage_digest(self._full_stage, record)), sample
+        
+        def records():
+            for record in self._iter_walk(source):
+                self.progress.scheduled(record.size)
+                yield record
+        
+        self.progress.reset("建立目录索引")
+        start = time.perf_counter()
+        for record, result in ordered_parallel_map(digests, records(), self.workers):
+            self.progress.done(record.size)
+            if isinstance(result, Exception):
+                self.report(f"处理文件 {record.path} 时出错: {result}")
+                continue
+            index.add(record, *result)
+        self.progress.finish()
+        index.finalize()
+        
+        if self.cache is not None and not self.cancelled:
+            self.cache.prune_missing(source, (index.path(number) for number in range(len(index))))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.report(f"读取文件内容 {self._bytes_read / (1024 * 1024):.1f} MB, "
+                    f"{self._bytes_read / elapsed / (1024 * 1024):.1f} MB/s")
+        self.report(index.summary())
+        return index
+    
+    def _iter_walk(self, folder: str) -> Iterator[FileRecord]:
+        """
+        在后台线程中并行遍历文件夹，通过有界队列逐个返回文件记录
+        
+        扫描暂停时在返回下一个记录之前等待；取消后不再返回记录。
+        """
+        records = queue.Queue(maxsize=WALK_QUEUE_SIZE)
+        done = object()
+        
+        def walk():
+            try:
+                ParallelFolderWalker([folder], self.walk_workers, self.report, self._dir_states,
+                                     self.control).run(lambda _, record: records.put(record))
+            finally:
+                records.put(done)
+        
+        threading.Thread(target=walk, daemon=True).start()
+        for record in iter(records.get, done):
+            if not self.control.checkpoint():
+                self.report("正在取消扫描，等待正在读取的文件完成...")
+                # 遍历线程看到取消后很快结束，取走剩下的记录，避免它阻塞在 put 上
+                for _ in iter(records.get, done):
+                    pass
+                return
+            self.progress.found(record.size)
+            yield record
+        self.progress.finish_walk()
+    
+    def _match_target(self, target: FileRecord) -> Optional[Tuple[str, FileRecord]]:
+        """
+        逐阶段比较一个目标文件与同样大小的源文件（在工作线程中执行）
+        
+        Returns:
+            (哈希值, 匹配的源文件记录)；没有重复时返回 None
+        
+        Raises:
+            OSError: 目标文件无法读取
+        """
+        index = self._source_index
+        sources = index.size_range(target.size)
+        if target.inode is not None:
+            # 目标文件是某个源文件的硬链接：不需要读取（哈希值留空，调用者按硬链接处理）
+            for number in sources:
+                if (index.devs[number], index.inos[number]) == target.inode:
+                    return '', FileRecord(*index.record(number))
+        if self.verify == 'bytes' and len(sources) == 1:
+            # 只有一个同样大小的源文件：不计算哈希值，直接比较内容
+            self._count_read(2 * target.size)
+            if files_identical(target.path, index.path(sources[0]), self.block_size):
+                return f"size:{target.size}", FileRecord(*index.record(sources[0]))
+            return None
+        
+        file_hash = None
+        for stage, (_, sample_size) in enumerate(self.stages):
+            if sample_size > 0 and target.size <= 2 * sample_size:
+                continue
+            file_hash = self._stage_digest(stage, target)
+            digest = bytes.fromhex(file_hash)
+            sources = [number for number in sources
+                       if self._source_digest(stage, number) == digest]
+            if not sources:
+                return None
+        
+        if self.verify == 'bytes':
+            self._count_read(2 * target.size)
+            if not files_identical(target.path, index.path(sources[0]), self.block_size):
+                self.report(f"哈希值相同但逐字节比较不一致，跳过: {target.path}")
+                return None
+        return file_hash, FileRecord(*index.record(sources[0]))
+    
+    def _stage_digest(self, stage: int, record: FileRecord) -> str:
+        """计算一个文件在某个阶段的摘要（先查缓存；同一个 inode 的硬链接只读取一次）"""
+        link = (stage, record.inode) if record.inode is not None else None
+        if link is not None and link in self._link_hashes:
+            return self._link_hashes[link]
+        cache_key = self._cache_key(stage)
+        if self.cache is not None:
+            cached = self.cache.get(record, cache_key)
+            if cached:
+                return cached
+        algorithm, sample_size = self.stages[stage]
+        file_hash = calculate_file_digest(record.path, algorithm, sample_size,
+                                          self.block_size, self.read_mode).hex()
+        self._count_read(self._read_size(stage, record.size))
+        if self.cache is not None:
+            self.cache.put(record, cache_key, file_hash)
+        if link is not None:
+            self._link_hashes[link] = file_hash
+        return file_hash
+    
+    def _count_read(self, size: int):
+        with self._source_lock:
+            self._bytes_read += size
+    
+    def _source_digest(self, stage: int, number: int) -> Optional[bytes]:
+        """源文件在某个阶段的原始摘要：每个源文件每个阶段只计算一次，读取失败时为 None"""
+        size = self._source_digest_sizes[stage]
+        digests = self._source_digests[stage]
+        if self._source_states is None:
+            return bytes(digests[number * size:(number + 1) * size])
+        states = self._source_states[stage]
+        with self._source_lock:
+            if states[number] == 1:
+                return bytes(digests[number * size:(number + 1) * size])
+            if states[number] == 2:
+                return None
+            # 正在计算的摘要由第一个请求它的线程计算，其他线程等待结果
+            key = (stage, number)
+            future = self._source_pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._source_pending[key] = Future()
+        if not owner:
+            return future.result()
+        
+        record = FileRecord(*self._source_index.record(number))
+        try:
+            digest = bytes.fromhex(self._stage_digest(stage, record))
+        except OSError as e:
+            self.report(f"处理文件 {record.path} 时出错: {e}")
+            digest = None
+        with self._source_lock:
+            if digest is None:
+                states[number] = 2
+            else:
+                digests[number * size:(number + 1) * size] = digest
+                states[number] = 1
+            del self._source_pending[key]
+        future.set_result(digest)
+        return digest
+    
+    def _folder_label(self, tree: int) -> str:
+        if self._within_folder:
+            return "文件夹"
+        if len(self._folders) == 2:
+            return "源文件夹" if tree < self._first_target else "目标文件夹"
+        if tree < self._first_target:
+            return f"源文件夹 {tree + 1} ({self._folders[tree]})"
+        return f"目标文件夹 {tree - self._first_target + 1} ({self._folders[tree]})"
+    
+    def _report_walk_summary(self):
+        for tree, file_sizes in enumerate(self._sizes):
+            count = sum(len(records) for records in file_sizes.values())
+            self.report(f"{self._folder_label(tree)}共有 {count} 个文件")
+        if self._within_folder:
+            self.report(f"大小相同的候选文件: {self._candidates[0]} 个")
+            return
+        self.report(f"大小相同的候选文件: 源 {sum(self._candidates[:self._first_target])} 个, "
+                    f"目标 {sum(self._candidates[self._first_target:])} 个")
+    
+    def _overlapping_trees(self, tables: List[Dict[Any, List[FileRecord]]], key: Any) -> List[int]:
+        """
+        key 出现在哪些文件夹中；只有目标文件夹中的文件可能与优先级更高的文件夹重复时
+        才返回这些文件夹（按优先级排列），否则返回空列表。单文件夹去重时 key 出现
+        两次以上就返回 [0]
+        """
+        if self._within_folder:
+            return [0] if len(tables[0].get(key, ())) >= 2 else []
+        present = [tree for tree, table in enumerate(tables) if key in table]
+        if len(present) >= 2 and present[-1] >= self._first_target:
+            return present
+        return []
+    
+    def _on_file(self, tree: int, record: FileRecord):
+        """遍历得到一个文件：大小在两边都出现时开始计算哈希值"""
+        size = record.size
+        self.progress.found(size)
+        self._sizes[tree].setdefault(size, []).append(record)
+        if size in self._common_sizes:
+            self._add_candidate(tree, record)
+        elif size in self._single_source_sizes:
+            # 出现了第二个参考文件，或者第三个文件夹，改为计算哈希值
+            if tree != self._single_source_sizes[size][1]:
+                del self._single_source_sizes[size]
+                self._start_size(size)
+        else:
+            present = self._overlapping_trees(self._sizes, size)
+            if not present:
+                return
+            if (self._compare_inline and len(present) == 2
+                    and len(self._sizes[present[0]][size]) == 1):
+                self._single_source_sizes[size] = tuple(present)
+            else:
+                self._start_size(size)
+    
+    def _start_size(self, size: int):
+        """某个大小在两边都出现：这个大小的所有文件开始计算哈希值"""
+        self._common_sizes.add(size)
+        for tree, file_sizes in enumerate(self._sizes):
+            for each in file_sizes.get(size, ()):
+                self._add_candidate(tree, each)
+    
+    def _compare_single_source_sizes(self):
+        """遍历结束：只有一个参考文件的大小直接逐字节比较，不计算哈希值"""
+        self._single_source_keeper = {}
+        for size, (keeper_tree, target_tree) in sorted(self._single_source_sizes.items()):
+            source = self._sizes[keeper_tree][size][0]
+            self._single_source_keeper[size] = keeper_tree
+            self._candidates[keeper_tree] += 1
+            for target in self._sizes[target_tree][size]:
+                self._candidates[target_tree] += 1
+                self._submit_compare(target, source, f"size:{size}")
+        self._single_source_sizes.clear()
+    
+    def _add_candidate(self, tree: int, record: FileRecord):
+        self._candidates[tree] += 1
+        if self.sample_size > 0 and record.size > 2 * self.sample_size:
+            self._submit(0, tree, record)
+        else:
+            # 小文件采样就等于读取全文，直接计算完整哈希值
+            self._submit(self._full_stage, tree, record)
+    
+    def _on_hashed(self, stage: int, tree: int, record: FileRecord, file_hash: str):
+        """某一阶段的摘要计算完成：(大小, 摘要) 在两边都出现时进入下一阶段"""
+        key = (record.size, file_hash)
+        stage_keys = self._keys[stage]
+        stage_keys[tree].setdefault(key, []).append(record)
+        common_keys = self._common_keys[stage]
+        if key in common_keys:
+            if stage == len(self.stages) - 1:
+                if self._compare_inline:
+                    self._verify_match(tree, record, key, file_hash)
+                else:
+                    self._announce(tree, record, key)
+            else:
+                self._submit(stage + 1, tree, record)
+            return
+        
+        present = self._overlapping_trees(stage_keys, key)
+        if not present:
+            return
+        common_keys.add(key)
+        for each_tree in present:
+            for each in stage_keys[each_tree][key]:
+                if stage == len(self.stages) - 1:
+                    if self._compare_inline:
+                        self._verify_match(each_tree, each, key, file_hash)
+                    else:
+                        self._announce(each_tree, each, key)
+                else:
+                    self._submit(stage + 1, each_tree, each)
+    
+    def _announce(self, tree: int, record: FileRecord, key: Tuple[int, str]):
+        """
+        最终阶段的 key 在 tree 中出现了 record（key 刚在多个文件夹中出现时，已有的记录
+        按文件夹优先级依次传入）：
+        按 scan() 的规则把已经确认的重复文件交给 on_duplicate。保留的文件在优先级最高的
+        文件夹中，它换成更高优先级文件夹中的文件时，原来所在的目标文件夹中的文件也成为
+        重复文件
+        """
+        if self.on_duplicate is None or self._within_folder:
+            return
+        keeper = self._live_keepers.get(key)
+        if keeper is None:
+            self._live_keepers[key] = tree
+        elif tree < keeper:
+            self._live_keepers[key] = tree
+            if keeper >= self._first_target:
+                for each in self._keys[-1][keeper][key]:
+                    self._announce_duplicate(each, key)
+        elif tree > keeper and tree >= self._first_target:
+            self._announce_duplicate(record, key)
+    
+    def _announce_duplicate(self, record: FileRecord, key: Tuple[int, str]):
+        """报告一个重复文件，与保留的文件或源文件是同一个 inode 的不报告（见 _split_hardlinks）"""
+        keepers = set(range(self._first_target)) | {self._live_keepers[key]}
+        if record.ino and any(same_file(record, each) for tree in keepers
+                              for each in self._keys[-1][tree].get(key, ())):
+            return
+        self.on_duplicate(key[1], record)
+    
+    def _verify_match(self, tree: int, record: FileRecord, key: Tuple[int, str], file_hash: str):
+        """
+        哈希值匹配的目标文件与优先级最高的、具有相同哈希值的文件逐字节比较
+        
+        保留的文件换成优先级更高的文件夹中的文件时，原来保留的文件（如果在目标文件夹中）
+        也要与新的保留文件比较；之前已经与原保留文件比较过的文件不必重新比较。
+        """
+        keeper = self._verify_sources.get(key)
+        if keeper is None:
+            self._verify_sources[key] = (tree, record)
+            return
+        keeper_tree, keeper_record = keeper
+        if tree < keeper_tree:
+            self._verify_sources[key] = (tree, record)
+            if keeper_tree >= self._first_target:
+                for each in self._keys[-1][keeper_tree][key]:
+                    self._submit_compare(each, record, file_hash)
+        elif tree > keeper_tree and tree >= self._first_target:
+            self._submit_compare(record, keeper_record, file_hash)
+    
+    def _submit_compare(self, target: FileRecord, source: FileRecord, group_key: str):
+        if same_file(target, source):
+            # 同一个文件的硬链接，内容必然相同
+            self._verified.setdefault(group_key, []).append(target)
+            return
+        self._compare_batch.append((target, source, group_key))
+        if len(self._compare_batch) >= self.batch_size:
+            self._flush_compare()
+    
+    def _flush_compare(self):
+        batch = self._compare_batch
+        if not batch:
+            return
+        self._compare_batch = []
+        self.progress.scheduled(sum(2 * target.size for target, _, _ in batch), len(batch))
+        self._ready.append((('compared', batch), _compare_file_batch,
+                            ([(target.path, source.path) for target, source, _ in batch],
+                             self.block_size)))
+        self._dispatch()
+    
+    def _on_compare_done(self, batch: List[Tuple[FileRecord, FileRecord, str]], future):
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [str(e)] * len(batch)
+        self.progress.done(sum(2 * target.size for target, _, _ in batch), len(batch))
+        for (target, source, group_key), identical in zip(batch, results):
+            if not isinstance(identical, bool):
+                self.report(f"比较文件 {target.path} 时出错: {identical}")
+                continue
+            self._bytes_read += 2 * target.size
+            if identical:
+                self._verified.setdefault(group_key, []).append(target)
+                if self.on_duplicate is not None:
+                    self.on_duplicate(group_key, target)
+            elif not group_key.startswith('size:'):
+                # 哈希值相同但内容不同（哈希碰撞或文件在扫描期间被修改）
+                self.report(f"哈希值相同但逐字节比较不一致，跳过: {target.path}")
+    
+    def _read_size(self, stage: int, size: int) -> int:
+        """计算某个阶段的摘要需要读取的字节数"""
+        sample_size = self.stages[stage][1]
+        return min(size, 2 * sample_size) if sample_size > 0 else size
+    
+    def _cache_key(self, stage: int) -> str:
+        algorithm, sample_size = self.stages[stage]
+        return f"{algorithm}:sample{sample_size}" if sample_size > 0 else algorithm
+    
+    def _submit(self, stage: int, tree: int, record: FileRecord):
+        """
+        安排计算一个文件的摘要（先查缓存，未命中的按批提交给工作线程）
+        
+        同一个 inode 的其他硬链接已经提交过时不再读取，直接使用（或等待）第一个链接的摘要
+        """
+        inode = record.inode
+        if inode is not None:
+            links = self._link_digests[stage]
+            if inode in links:
+                link_state = links[inode]
+                if isinstance(link_state, list):
+                    link_state.append((tree, record))
+                elif link_state:
+                    self._on_hashed(stage, tree, record, link_state)
+                else:
+                    self.report(f"处理文件 {record.path} 时出错: 同一个文件的其他硬链接无法读取")
+                return
+            links[inode] = []
+        if self.cache is not None:
+            cached = self.cache.get(record, self._cache_key(stage))
+            if cached:
+                self._on_hashed(stage, tree, record, cached)
+                self._resolve_links(stage, record, cached)
+                return
+        batch = self._batches[stage]
+        batch.append((tree, record))
+        if len(batch) >= self.batch_size:
+            self._flush(stage)
+    
+    def _flush(self, stage: int):
+        batch = self._batches[stage]
+        if not batch:
+            return
+        self._batches[stage] = []
+        algorithm, sample_size = self.stages[stage]
+        self.progress.scheduled(sum(self._read_size(stage, record.size) for _, record in batch),
+                                len(batch))
+        self._ready.append((('hashed', stage, batch), _hash_file_batch,
+                            ([record.path for _, record in batch], algorithm, sample_size,
+                             self.block_size, self.read_mode)))
+        self._dispatch()
+    
+    def _flush_all(self):
+        for stage in range(len(self.stages)):
+            self._flush(stage)
+        self._flush_compare()
+    
+    def _dispatch(self):
+        """
+        把排队的批次提交给工作线程，同时最多 workers * SUBMIT_WINDOW 批，
+        每完成一批再提交一批；扫描暂停或取消时不提交
+        """
+        limit = self.workers * SUBMIT_WINDOW
+        while self._ready and self._outstanding < limit and self.control.running:
+            event, function, args = self._ready.popleft()
+            future = self._executor.submit(function, *args)
+            self._outstanding += 1
+            future.add_done_callback(lambda done, event=event: self._events.put(event + (done,)))
+    
+    def _on_batch_done(self, stage: int, batch: List[Tuple[int, FileRecord]], future):
+        try:
+            digests = future.result()
+        except Exception as e:
+            digests = [str(e)] * len(batch)
+        self.progress.done(sum(self._read_size(stage, record.size) for _, record in batch),
+                           len(batch))
+        for (tree, record), digest in zip(batch, digests):
+            if not isinstance(digest, bytes):
+                self.report(f"处理文件 {record.path} 时出错: {digest}")
+                self._resolve_links(stage, record, '')
+                continue
+            self._bytes_read += self._read_size(stage, record.size)
+            file_hash = digest.hex()
+            if self.cache is not None:
+                self.cache.put(record, self._cache_key(stage), file_hash)
+            self._on_hashed(stage, tree, record, file_hash)
+            self._resolve_links(stage, record, file_hash)
+    
+    def _resolve_links(self, stage: int, record: FileRecord, file_hash: str):
+        """第一个硬链接的摘要已经得到（file_hash 为空表示读取失败），处理等待的其他链接"""
+        inode = record.inode
+        if inode is None:
+            return
+        waiting = self._link_digests[stage].get(inode)
+        self._link_digests[stage][inode] = file_hash
+        for tree, link in waiting or ():
+            if file_hash:
+                self._on_hashed(stage, tree, link, file_hash)
+            else:
+                self.report(f"处理文件 {link.path} 时出错: 同一个文件的其他硬链接无法读取")
+
+
+def find_duplicates(source_folder: str, target_folder: str, algorithm: str = 'md5',
+                    progress_callback: Optional[Callable[[str], None]] = None,
+                    **scan_options) -> Dict[str, List[FileRecord]]:
+    """
+    查找目标文件夹中与源文件夹内容相同的文件
+    
+    按 大小 → 头尾样本 → 完整哈希值 三个阶段逐步筛选：只有在两边都出现的大小
+    才需要读取文件内容，大文件先比较头部和尾部样本，样本仍然相同的才读取全文。
+    两个文件夹并行遍历，遍历的同时就开始计算哈希值（见 DuplicateScanner）。
+    
+    源文件夹也可以是目录索引文件（见 build_catalog）或一个或多个校验和清单
+    （sha256sum/md5sum 格式），此时不再扫描源文件夹，目标文件逐个与索引或清单比较
+    （见 DuplicateScanner.stream）。
+    
+    源文件夹和目标文件夹都可以是按优先级排列的文件夹列表，所有文件夹一次扫描完成，
+    目标文件在任何优先级更高的文件夹中出现就算重复（见 DuplicateScanner）。
+    
+    Args:
+        source_folder: 源文件夹（参考文件夹）或源文件夹列表，目录索引文件，
+                       或校验和清单（路径或路径列表）
+        target_folder: 目标文件夹（要清理的文件夹）或目标文件夹列表
+        algorithm: 哈希算法
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+        **scan_options: 传给 DuplicateScanner 的其他选项（sample_size、cache、workers、
+                        backend、walk_workers、confirm_algorithm、block_size、read_mode、verify、
+                        trust_dir_mtime、progress、control、on_duplicate）
+    
+    Returns:
+        字典，键为哈希值，值为目标文件夹中具有该哈希值的重复文件记录列表（按路径排序）
+    """
+    scanner = DuplicateScanner(algorithm, progress_callback=progress_callback, **scan_options)
+    return find_duplicates_with(scanner, source_folder, target_folder)
+
+
+def find_duplicates_with(scanner: DuplicateScanner, source_folder: Any,
+                          target_folder: Any) -> Dict[str, List[FileRecord]]:
+    """
+    用给定的 scanner 执行 find_duplicates，之后还可以从 scanner 取得保留的文件、硬链接
+    和结果中哈希值的算法（result_algorithm）
+    """
+    if is_catalog(source_folder) or is_manifest(source_folder):
+        matches = {}
+        for file_hash, record, _ in scanner.stream(source_folder, target_folder):
+            matches.setdefault(file_hash, []).append(record)
+        for records in matches.values():
+            records.sort(key=lambda record: record.path)
+        return dict(sorted(matches.items(), key=lambda item: item[1][0].path))
+    scanner.report("\n1. 并行扫描源文件夹和目标文件夹，同时计算候选文件哈希值...")
+    return scanner.scan(source_folder, target_folder)
+
+
+def is_catalog(source: Any) -> bool:
+    """source 是否为目录索引（已经载入的 CompactIndex，或索引文件路径）而不是文件夹"""
+    if isinstance(source, CompactIndex):
+        return True
+    if not isinstance(source, str) or not os.path.isfile(source):
+        return False
+    try:
+        with open(source, 'rb') as f:
+            return f.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+    except OSError:
+        return False
+
+
+def is_manifest(source: Any) -> bool:
+    """source 是否为校验和清单（ManifestIndex、清单文件路径或清单文件路径列表）"""
+    if isinstance(source, ManifestIndex):
+        return True
+    if isinstance(source, (list, tuple)):
+        return bool(source) and all(isinstance(path, str) and is_manifest_file(path) for path in source)
+    return isinstance(source, str) and os.path.isfile(source) and is_manifest_file(source)
+
+
+def build_catalog(source_folder: str, output_path: str, algorithm: str = 'md5',
+                  progress_callback: Optional[Callable[[str], None]] = None,
+                  **scan_options) -> CompactIndex:
+    """
+    扫描源文件夹并生成目录索引文件，之后可以直接与多个目标文件夹比较，不必重新扫描源文件夹
+    
+    Args:
+        source_folder: 源文件夹（参考文件夹）
+        output_path: 索引文件路径
+        algorithm: 哈希算法（必须是强哈希算法）
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+        **scan_options: 传给 DuplicateScanner 的其他选项（sample_size、cache、workers、
+                        walk_workers、block_size、read_mode、trust_dir_mtime、progress、control）
+    
+    Returns:
+        生成的索引；扫描被取消时索引不完整，不保存
+    """
+    scanner = DuplicateScanner(algorithm, progress_callback=progress_callback, **scan_options)
+    index = scanner.build_catalog(source_folder)
+    if not scanner.cancelled:
+        index.save(output_path)
+    return index
+
+
+def write_duplicates_manifest(file_path: str, duplicates: Dict[str, List[FileRecord]],
+                              algorithm: str) -> int:
+    """
+    把找到的重复文件写成校验和清单（sha256sum -c 等工具可以直接校验）
+    
+    逐字节比较得到的 'size:<大小>' 分组没有哈希值，不写入清单。
+    
+    Returns:
+        写入的文件数量
+    """
+    return write_manifest(file_path, ((file_hash, record.path)
+                                      for file_hash, records in duplicates.items()
+                                      if not file_hash.startswith('size:')
+                                      for record in records), algorithm)
+
+
+def _stream_and_delete_duplicates(source_folder: str, target_folder: str, algorithm: str,
+                                  dry_run: bool, manifest_path: Optional[str] = None,
+                                  prune_dirs: bool = False, **scan_options) -> Tuple[int, int]:
+    """流式模式的 find_and_delete_duplicates：每确认一个重复文件就立即输出（并删除）"""
+    duplicate_count = 0
+    deleted_count = 0
+    found = {}
+    records = []
+    emptied = set()
+    with ConsoleProgress() as console:
+        scanner = DuplicateScanner(algorithm, progress_callback=console.print,
+                                   progress=console.counters, **scan_options)
+        for file_hash, record, source in scanner.stream(source_folder, target_folder):
+            duplicate_count += 1
+            records.append(record)
+            if manifest_path:
+                found.setdefault(file_hash, []).append(record)
+            # 取消后仍会返回已经开始比较的文件，只列出不删除
+            if dry_run or scanner.cancelled:
+                console.print(f"  - {record.path}  (与 {source.path} 相同)")
+                continue
+            try:
+                os.remove(record.path)
+                deleted_count += 1
+                emptied.add(os.path.dirname(record.path))
+                console.print(f"已删除: {record.path}  (与 {source.path} 相同)")
+            except Exception as e:
+                console.print(f"删除文件 {record.path} 失败: {e}")
+    
+    if prune_dirs and emptied:
+        # 由深到浅，子文件夹删除之后其上级文件夹才可能变空
+        removed = []
+        for directory in sorted(emptied, key=lambda path: path.count(os.sep), reverse=True):
+            removed.extend(prune_empty_dirs(directory, [target_folder]))
+        print(f"清理 {len(removed)} 个空文件夹")
+    print(f"\n找到 {duplicate_count} 个重复文件，可释放 {_format_mb(reclaimable_bytes(records))}")
+    _report_hardlinks(scanner.hardlinks)
+    if manifest_path:
+        _report_manifest_written(manifest_path, found, scanner)
+    if dry_run and duplicate_count:
+        print(f"[试运行模式] 将删除 {duplicate_count} 个重复文件")
+        print("如要实际删除，请使用 --execute 参数")
+    return duplicate_count, deleted_count
+
+
+def _format_mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def _report_hardlinks(hardlinks: List[Tuple[FileRecord, FileRecord]]):
+    """列出与保留的文件是同一个 inode 的重复文件（删除它们不会释放空间，所以不删除）"""
+    if not hardlinks:
+        return
+    print(f"\n以下 {len(hardlinks)} 个文件与保留的文件是同一个文件的硬链接，删除不会释放空间，已跳过:")
+    for link, original in sorted(hardlinks, key=lambda pair: pair[0].path):
+        print(f"  = {link.path}  (与 {original.path} 是同一个文件)")
+
+
+def _report_manifest_written(manifest_path: str, duplicates: Dict[str, List[FileRecord]],
+                             scanner: DuplicateScanner):
+    # CRC32/Adler-32 预筛选之后是确认算法的摘要，使用目录索引或校验和清单时是它们的算法
+    algorithm = scanner.result_algorithm
+    count = write_duplicates_manifest(manifest_path, duplicates, algorithm)
+    print(f"已写入校验和清单: {manifest_path} ({count} 个文件, {algorithm.upper()})")
+
+
+def find_and_delete_duplicates(source_folder: str, target_folder: str, 
+                             algorithm: str = 'md5', dry_run: bool = True,
+                             stream: bool = False, manifest_path: Optional[str] = None,
+                             delete_workers: int = DEFAULT_DELETE_WORKERS, prune_dirs: bool = False,
+                             **scan_options) -> Tuple[int, int]:
+    """
+    查找并删除重复文件
+    
+    Args:
+        source_folder: 源文件夹（参考文件夹）或源文件夹列表，或目录索引文件
+        target_folder: 目标文件夹（要清理的文件夹）或目标文件夹列表
+        algorithm: 哈希算法
+        dry_run: 是否为试运行模式（不实际删除文件）
+        stream: 流式模式，只为源文件夹建立索引，每确认一个重复文件就立即输出（并删除）
+        manifest_path: 把找到的重复文件写成校验和清单
+        delete_workers: 并行删除文件的线程数（流式模式逐个删除，不使用）
+        prune_dirs: 删除后清理目标文件夹中变空的子文件夹
+        **scan_options: 传给 DuplicateScanner 的其他选项（见 find_duplicates）
+    
+    Returns:
+        元组：(找到的重复文件数量, 实际删除的文件数量)
+    """
+    print("=" * 60)
+    print("开始文件重复检测...")
+    print("=" * 60)
+    
+    if stream:
+        return _stream_and_delete_duplicates(source_folder, target_folder, algorithm,
+                                             dry_run, manifest_path, prune_dirs, **scan_options)
+    
+    with ConsoleProgress() as console:
+        scanner = DuplicateScanner(algorithm, progress_callback=console.print,
+                                   progress=console.counters, **scan_options)
+        duplicates = find_duplicates_with(scanner, source_folder, target_folder)
+    
+    # 查找重复文件
+    print("\n2. 查找重复文件...")
+    duplicate_files = []
+    for records in duplicates.values():
+        duplicate_files.extend(record.path for record in records)
+    
+    reclaimable = reclaimable_bytes(record for records in duplicates.values() for record in records)
+    print(f"\n找到 {len(duplicate_files)} 个重复文件，可释放 {_format_mb(reclaimable)}:")
+    for file_path in duplicate_files:
+        print(f"  - {file_path}")
+    _report_hardlinks(scanner.hardlinks)
+    if manifest_path:
+        _report_manifest_written(manifest_path, duplicates, scanner)
+    
+    if scanner.cancelled:
+        print("\n扫描已被取消，以上只是取消前已经确认的重复文件，不删除文件")
+        return len(duplicate_files), 0
+    return len(duplicate_files), _delete_files(duplicate_files, dry_run, delete_workers,
+                                               _folder_list(target_folder) if prune_dirs else None)
+
+
+def _delete_files(file_paths: List[str], dry_run: bool, workers: int = DEFAULT_DELETE_WORKERS,
+                  prune_within: Optional[List[str]] = None) -> int:
+    """删除重复文件（试运行模式只提示），返回实际删除的文件数量"""
+    if not file_paths:
+        return 0
+    if dry_run:
+        print(f"\n[试运行模式] 将删除 {len(file_paths)} 个重复文件")
+        print("如要实际删除，请使用 --execute 参数")
+        return 0
+    print(f"\n开始删除 {len(file_paths)} 个重复文件...")
+    deleter = delete_files(file_paths, workers, prune_within)
+    for file_path, error in deleter.failed:
+        print(f"删除文件 {file_path} 失败: {error}")
+    print(deleter.summary())
+    return len(deleter.deleted)
+
+
+def dedupe_and_delete_duplicates(folder: str, algorithm: str = 'md5', dry_run: bool = True,
+                                 keep: str = 'shortest', prefer: Iterable[str] = (),
+                                 manifest_path: Optional[str] = None,
+                                 delete_workers: int = DEFAULT_DELETE_WORKERS,
+                                 prune_dirs: bool = False,
+                                 **scan_options) -> Tuple[int, int]:
+    """
+    查找并删除一个文件夹内部的重复文件，每组保留一份
+    
+    Args:
+        folder: 文件夹路径
+        algorithm: 哈希算法
+        dry_run: 是否为试运行模式（不实际删除文件）
+        keep: 保留策略（见 KEEP_POLICIES）
+        prefer: 优先保留的子文件夹，按优先级排列
+        manifest_path: 把找到的重复文件写成校验和清单
+        delete_workers: 并行删除文件的线程数
+        prune_dirs: 删除后清理文件夹中变空的子文件夹
+        **scan_options: 传给 DuplicateScanner 的其他选项（见 find_duplicates）
+    
+    Returns:
+        元组：(找到的重复文件数量, 实际删除的文件数量)
+    """
+    print("=" * 60)
+    print("开始文件重复检测...")
+    print("=" * 60)
+    
+    with ConsoleProgress() as console:
+        scanner = DuplicateScanner(algorithm, progress_callback=console.print,
+                                   progress=console.counters, **scan_options)
+        console.print("\n1. 扫描文件夹，同时计算候选文件哈希值...")
+        duplicates = scanner.dedupe(folder, keep, prefer)
+    kept, hardlinks = scanner.kept, scanner.hardlinks
+    
+    print("\n2. 查找重复文件...")
+    duplicate_files = []
+    for file_hash, records in duplicates.items():
+        print(f"\n保留: {kept[file_hash].path}")
+        for record in records:
+            print(f"  - {record.path}")
+            duplicate_files.append(record.path)
+    
+    reclaimable = reclaimable_bytes(record for records in duplicates.values() for record in records)
+    print(f"\n找到 {len(duplicates)} 组, {len(duplicate_files)} 个重复文件，可释放 {_format_mb(reclaimable)}")
+    _report_hardlinks(hardlinks)
+    if manifest_path:
+        _report_manifest_written(manifest_path, duplicates, scanner)
+    
+    if scanner.cancelled:
+        print("\n扫描已被取消，以上只是取消前已经确认的重复文件，不删除文件")
+        return len(duplicate_files), 0
+    return len(duplicate_files), _delete_files(duplicate_files, dry_run, delete_workers,
+                                               [folder] if prune_dirs else None)
+
+
+def _add_hashing_arguments(parser: argparse.ArgumentParser):
+    """添加 compare 和 catalog build 共用的哈希计算参数"""
+    parser.add_argument('--digest-size', type=int, metavar='BYTES',
+                       help='BLAKE2b 的摘要长度，1-64 字节 (默认: 64)')
+    parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE, metavar='BYTES',
+                       help=f'大文件先比较头部和尾部各 BYTES 字节的样本，0 表示不采样 (默认: {DEFAULT_SAMPLE_SIZE})')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, metavar='BYTES',
+                       help=f'计算完整哈希值时每次读取的字节数 (默认: {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--read-mode', choices=READ_MODES, default='readinto',
+                       help='读取文件的方式：readinto 复用缓冲区；file_digest 使用 hashlib.file_digest；'
+                            'mmap 内存映射大文件 (默认: readinto)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, metavar='N',
+                       help=f'并行计算哈希值的线程数或进程数，机械硬盘建议设为 1 (默认: {DEFAULT_WORKERS})')
+    parser.add_argument('--walk-workers', type=int, default=DEFAULT_WALK_WORKERS, metavar='N',
+                       help=f'并行遍历目录的线程数 (默认: {DEFAULT_WALK_WORKERS})')
+    parser.add_argument('--cache', metavar='FILE',
+                       help='哈希值缓存数据库文件，未变化的文件直接复用上次的哈希值')
+    parser.add_argument('--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES, metavar='N',
+                       help=f'缓存最多保留的条目数量 (默认: {DEFAULT_MAX_ENTRIES})')
+    parser.add_argument('--trust-dir-mtime', action='store_true',
+                       help='在 --cache 中保存每个目录的内容，目录的修改时间没有变化时直接复用上次的'
+                            '文件列表，不再遍历；原地修改的文件不会被发现，只适合写入后不再修改的文件夹')
+
+
+def catalog_main(argv: List[str]):
+    """catalog 子命令：生成或查看源文件夹的目录索引"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} catalog",
+        description="扫描一次源文件夹生成目录索引，之后用 --catalog 与任意多个目标文件夹比较",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python compare_and_delete_duplicates.py catalog build source_folder -o master.idx
+  python compare_and_delete_duplicates.py catalog info master.idx
+  python compare_and_delete_duplicates.py compare --catalog master.idx target_folder --execute
+        """
+    )
+    commands = parser.add_subparsers(dest='command')
+    build_parser = commands.add_parser('build', help='扫描源文件夹并生成目录索引文件')
+    build_parser.add_argument('source_folder', help='源文件夹路径（参考文件夹）')
+    build_parser.add_argument('-o', '--output', required=True, metavar='FILE', help='目录索引文件路径')
+    build_parser.add_argument('--algorithm', choices=STRONG_ALGORITHMS + ('auto',), default='md5',
+                              help='哈希算法，auto 表示测速选择最快的算法 (默认: md5)')
+    build_parser.add_argument('--manifest', metavar='FILE',
+                              help='同时把源文件夹所有文件的哈希值写成校验和清单（md5sum/sha256sum 格式）')
+    _add_hashing_arguments(build_parser)
+    info_parser = commands.add_parser('info', help='显示目录索引文件的信息')
+    info_parser.add_argument('catalog', help='目录索引文件路径')
+    
+    args = parser.parse_args(argv)
+    if args.command == 'info':
+        try:
+            index = CompactIndex.load(args.catalog)
+        except (OSError, ValueError) as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        metadata = index.metadata
+        print(f"源文件夹: {metadata.get('source', '')}")
+        print(f"生成时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(metadata.get('created', 0)))}")
+        print(f"哈希算法: {metadata['algorithm'].upper()}，采样 {metadata.get('sample_size', 0)} 字节")
+        print(index.summary())
+        return
+    if args.command != 'build':
+        parser.print_help()
+        sys.exit(1)
+    
+    if args.trust_dir_mtime and not args.cache:
+        parser.error("--trust-dir-mtime 需要同时指定 --cache")
+    if not os.path.isdir(args.source_folder):
+        print(f"错误：源文件夹 '{args.source_folder}' 不存在")
+        sys.exit(1)
+    try:
+        algorithm = resolve_algorithm(args.algorithm, args.digest_size)
+    except ValueError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    
+    print(f"生成目录索引: {os.path.abspath(args.source_folder)} -> {args.output}")
+    print(f"哈希算法: {algorithm.upper()}")
+    cache = HashCache(args.cache, args.cache_max_entries) if args.cache else None
+    control = ScanControl()
+    try:
+        with ConsoleProgress() as console, cancel_on_signals(control):
+            index = build_catalog(args.source_folder, args.output, algorithm, console.print,
+                                  sample_size=args.sample_size, cache=cache, workers=args.workers,
+                                  walk_workers=args.walk_workers, block_size=args.block_size,
+                                  read_mode=args.read_mode, trust_dir_mtime=args.trust_dir_mtime,
+                                  progress=console.counters, control=control)
+        if control.cancelled:
+            # 已经计算的哈希值仍然保存在缓存中，下次生成时直接复用
+            print("\n操作已取消，目录索引不完整，没有保存")
+            sys.exit(1)
+        print(f"目录索引已保存: {args.output}")
+        if args.manifest:
+            count = write_manifest(args.manifest, ((index.digest(number).hex(), index.path(number))
+                                                   for number in range(len(index))), algorithm)
+            print(f"已写入校验和清单: {args.manifest} ({count} 个文件)")
+    except KeyboardInterrupt:
+        print("\n\n操作被用户中断")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+            print(cache.summary())
+
+
+def watch_main(argv: List[str]):
+    """watch 子命令：源文件夹索引常驻内存，目标文件夹中新写入的文件一到就比较（并删除）"""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} watch",
+        description="建立一次源文件夹索引，然后持续监视目标文件夹，新文件写入完成后立即与源文件比较",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python compare_and_delete_duplicates.py watch source_folder ingest_folder
+  python compare_and_delete_duplicates.py watch master.idx ingest_folder --execute --debounce 5
+        """
+    )
+    parser.add_argument('source_folder', help='源文件夹路径（参考文件夹），也可以是目录索引文件或校验和清单')
+    parser.add_argument('target_folder', help='要监视的目标文件夹')
+    parser.add_argument('--algorithm', choices=ALGORITHM_CHOICES, default='md5',
+                        help='哈希算法，使用目录索引或清单时以索引或清单为准 (默认: md5)')
+    parser.add_argument('--confirm-algorithm', choices=STRONG_ALGORITHMS + ('auto',),
+                        default=DEFAULT_CONFIRM_ALGORITHM,
+                        help=f'快速预筛选之后确认匹配结果的强哈希算法 (默认: {DEFAULT_CONFIRM_ALGORITHM})')
+    parser.add_argument('--verify', choices=VERIFY_MODES, default='none',
+                        help='bytes: 删除前与匹配的源文件逐字节比较 (默认: none)')
+    parser.add_argument('--execute', action='store_true', help='实际删除重复文件（默认只输出）')
+    parser.add_argument('--existing', action='store_true',
+                        help='开始监视时先处理目标文件夹中已有的文件')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE, metavar='SECONDS',
+                        help=f'文件最后一次变化之后等待多少秒才认为写入完成 (默认: {DEFAULT_DEBOUNCE:g})')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, metavar='N',
+                        help=f'等待处理的文件最多排队的数量 (默认: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--polling', action='store_true',
+                        help='不使用 inotify，定期遍历目标文件夹（网络文件系统上 inotify 收不到其他机器写入的事件）')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                        help=f'轮询模式下两次遍历的间隔 (默认: {DEFAULT_POLL_INTERVAL:g})')
+    _add_hashing_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    if args.trust_dir_mtime and not args.cache:
+        parser.error("--trust-dir-mtime 需要同时指定 --cache")
+    if not os.path.exists(args.source_folder):
+        print(f"错误：源文件夹 '{args.source_folder}' 不存在")
+        sys.exit(1)
+    if not os.path.isdir(args.target_folder):
+        print(f"错误：目标文件夹 '{args.target_folder}' 不存在")
+        sys.exit(1)
+    if os.path.isdir(args.source_folder) and find_overlapping_folders([args.source_folder,
+                                                                      args.target_folder]):
+        print("错误：源文件夹和目标文件夹不能相同或互相包含")
+        sys.exit(1)
+    try:
+        algorithm = resolve_algorithm(args.algorithm, args.digest_size)
+        confirm_algorithm = resolve_algorithm(args.confirm_algorithm)
+    except ValueError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    
+    cache = HashCache(args.cache, args.cache_max_entries) if args.cache else None
+    scanner = DuplicateScanner(algorithm, sample_size=args.sample_size, cache=cache,
+                               workers=args.workers, walk_workers=args.walk_workers,
+                               confirm_algorithm=confirm_algorithm, block_size=args.block_size,
+                               read_mode=args.read_mode, verify=args.verify,
+                               trust_dir_mtime=args.trust_dir_mtime)
+    found = deleted = 0
+    
+    def match(path):
+        try:
+            record = stat_file_record(path)
+        except FileNotFoundError:
+            # 文件在写入完成后很快又被移走或删除
+            return None
+        return record, scanner.match_file(record)
+    
+    def handle(path, result):
+        nonlocal found, deleted
+        if isinstance(result, Exception):
+            print(f"处理文件 {path} 时出错: {result}")
+            return
+        if result is None or result[1] is None:
+            return
+        record, (_, source) = result
+        if same_file(record, source):
+            print(f"  = {record.path}  (与 {source.path} 是同一个文件的硬链接，跳过)")
+            return
+        found += 1
+        if not args.execute:
+            print(f"  - {record.path}  (与 {source.path} 相同)")
+            return
+        try:
+            os.remove(record.path)
+            deleted += 1
+            print(f"已删除: {record.path}  (与 {source.path} 相同)")
+        except OSError as e:
+            print(f"删除文件 {record.path} 失败: {e}")
+    
+    watcher = None
+    # SIGTERM（例如作为服务停止时）与 Ctrl+C 一样停止监视并输出统计
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        scanner.load_source(args.source_folder)
+        watcher = FolderWatcher(args.target_folder, args.debounce, args.queue_size,
+                                args.poll_interval, use_inotify=not args.polling)
+        watcher.start()
+        if args.existing:
+            print("\n处理目标文件夹中已有的文件...")
+            existing = (record.path for record in scanner._iter_walk(args.target_folder))
+            for path, result in ordered_parallel_map(match, existing, scanner.workers):
+                handle(path, result)
+        print(f"\n开始监视 {os.path.abspath(args.target_folder)} "
+              f"({'inotify' if watcher.mode == 'inotify' else f'每 {args.poll_interval:g} 秒轮询'}, "
+              f"{'实际删除' if args.execute else '试运行，不删除文件'})，按 Ctrl+C 停止")
+        for path, result in watch_parallel_map(match, watcher, scanner.workers):
+            handle(path, result)
+    except KeyboardInterrupt:
+        print("\n\n停止监视")
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        print(f"找到重复文件: {found} 个" + (f", 成功删除: {deleted} 个" if args.execute else ""))
+        if scanner._source_index is not None:
+            print(scanner.source_summary())
+        if cache is not None:
+            cache.close()
+            print(cache.summary())
+
+
+def main():
+    """主函数"""
+    argv = sys.argv[1:]
+    if argv and argv[0] == 'catalog':
+        catalog_main(argv[1:])
+        return
+    if argv and argv[0] == 'watch':
+        watch_main(argv[1:])
+        return
+    if argv and argv[0] == 'compare':
+        argv = argv[1:]
+    
+    parser = argparse.ArgumentParser(
+        description="比较两个文件夹中文件的哈希值，删除第二个文件夹中的重复文件",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python compare_and_delete_duplicates.py source_folder target_folder
+  python compare_and_delete_duplicates.py source_folder target_folder --execute
+  python compare_and_delete_duplicates.py source_folder target_folder --algorithm sha256 --execute
+  python compare_and_delete_duplicates.py --source master --source archive --target backup1 --target backup2
+  python compare_and_delete_duplicates.py --dedupe folder --keep oldest --prefer originals
+  python compare_and_delete_duplicates.py catalog build source_folder -o master.idx
+  python compare_and_delete_duplicates.py compare --catalog master.idx target_folder --execute
+  python compare_and_delete_duplicates.py watch source_folder ingest_folder --execute
+        """
+    )
+    
+    parser.add_argument('source_folder', nargs='?', help='源文件夹路径（参考文件夹），使用 --catalog 时省略')
+    parser.add_argument('target_folder', nargs='?', help='目标文件夹路径（要清理重复文件的文件夹）')
+    parser.add_argument('--source', metavar='DIR', action='append', default=[],
+                       help='源文件夹，可以指定多次，按给出的顺序决定优先级')
+    parser.add_argument('--target', metavar='DIR', action='append', default=[],
+                       help='目标文件夹，可以指定多次；目标文件夹的优先级低于所有源文件夹，'
+                            '其中的文件在任何优先级更高的文件夹中出现就会被删除')
+    parser.add_argument('--dedupe', action='store_true',
+                       help='在一个文件夹内部查找重复文件，每组按 --keep/--prefer 保留一份，删除其余的')
+    parser.add_argument('--keep', choices=KEEP_POLICIES, default='shortest',
+                       help='--dedupe 时每组保留哪一份：shortest 路径最短，oldest 修改时间最早 (默认: shortest)')
+    parser.add_argument('--prefer', metavar='SUBDIR', action='append', default=[],
+                       help='--dedupe 时优先保留这个子文件夹（相对于要去重的文件夹）中的文件，'
+                            '可以指定多次，按给出的顺序决定优先级，优先于 --keep')
+    parser.add_argument('--catalog', metavar='FILE',
+                       help='用 catalog build 生成的目录索引代替源文件夹，不再扫描源文件夹')
+    parser.add_argument('--manifest', metavar='FILE', action='append',
+                       help='用校验和清单（sha256sum/md5sum 等格式）代替源文件夹，可以指定多次；'
+                            '不读取任何源文件，哈希算法由清单决定')
+    parser.add_argument('--write-manifest', metavar='FILE',
+                       help='把找到的重复文件写成校验和清单，可以用 sha256sum -c 等工具校验')
+    parser.add_argument('--algorithm', choices=ALGORITHM_CHOICES, 
+                       default='md5', help='哈希算法；crc32/adler32 为快速预筛选，匹配结果会再用 '
+                                           '--confirm-algorithm 确认；auto 表示测速选择最快的强哈希算法 (默认: md5)')
+    parser.add_argument('--confirm-algorithm', choices=STRONG_ALGORITHMS + ('auto',),
+                       default=DEFAULT_CONFIRM_ALGORITHM,
+                       help=f'快速预筛选之后确认匹配结果的强哈希算法 (默认: {DEFAULT_CONFIRM_ALGORITHM})')
+    parser.add_argument('--execute', action='store_true', 
+                       help='实际执行删除操作（默认为试运行模式）')
+    parser.add_argument('--delete-workers', type=int, default=DEFAULT_DELETE_WORKERS, metavar='N',
+                       help=f'并行删除文件的线程数，网络文件系统上可以调大 (默认: {DEFAULT_DELETE_WORKERS})')
+    parser.add_argument('--prune-empty-dirs', action='store_true',
+                       help='删除重复文件后清理目标文件夹中因此变空的子文件夹')
+    parser.add_argument('--benchmark-read', action='store_true',
+                       help='分别测试各种读取方式在源文件夹和目标文件夹上的速度（MB/s）后退出，不查找重复文件')
+    parser.add_argument('--verify', choices=VERIFY_MODES, default='none',
+                       help='bytes: 删除前与匹配的源文件逐字节比较；只有一个同样大小的源文件时'
+                            '跳过哈希计算直接比较 (默认: none)')
+    parser.add_argument('--stream', action='store_true',
+                       help='流式模式：只为源文件夹建立索引，目标文件边遍历边比较，'
+                            '每确认一个重复文件就立即输出（并删除）')
+    parser.add_argument('--backend', choices=BACKENDS, default='thread',
+                       help='哈希计算后端：thread 适合大文件，process 适合大量小文件；--stream 以及'
+                            '使用目录索引或校验和清单时逐个比较目标文件，只能使用 thread (默认: thread)')
+    _add_hashing_arguments(parser)
+    
+    args = parser.parse_args(argv)
+    if args.catalog and args.manifest:
+        parser.error("--catalog 和 --manifest 不能同时使用")
+    # 位置参数在前：没有 --source 时第一个位置参数是源文件夹，其余的都是目标文件夹
+    positional = [folder for folder in (args.source_folder, args.target_folder) if folder is not None]
+    if args.dedupe:
+        if (args.catalog or args.manifest or args.source or args.stream
+                or len(positional) + len(args.target) != 1):
+            parser.error("--dedupe 只需要指定一个文件夹，不能与 --source/--catalog/--manifest/--stream 同时使用")
+        sources = []
+    elif args.catalog or args.manifest:
+        if args.source or len(positional) + len(args.target) != 1:
+            parser.error("使用 --catalog 或 --manifest 时只需要指定一个目标文件夹")
+        sources = [args.catalog or args.manifest[0]]
+    else:
+        sources = args.source or positional[:1]
+        if not args.source:
+            positional = positional[1:]
+    targets = positional + args.target
+    if not (sources or args.dedupe) or not targets:
+        parser.error("需要指定源文件夹和目标文件夹（或 --catalog/--manifest 和目标文件夹）")
+    multiple = len(sources) > 1 or len(targets) > 1
+    if multiple and args.stream:
+        parser.error("--stream 只支持一个源文件夹和一个目标文件夹")
+    if args.backend == 'process' and (args.stream or any(map(is_catalog, sources)) or is_manifest(sources)):
+        parser.error("--backend process 不能与 --stream、目录索引或校验和清单同时使用"
+                     "（逐个比较目标文件时只能使用线程）")
+    if args.trust_dir_mtime and not args.cache:
+        parser.error("--trust-dir-mtime 需要同时指定 --cache")
+    args.source_folder, args.target_folder = (sources or targets)[0], targets[0]
+    
+    # 验证文件夹路径
+    for source_path in args.manifest or sources:
+        if not os.path.exists(source_path):
+            print(f"错误：源文件夹 '{source_path}' 不存在")
+            sys.exit(1)
+    
+    for target_path in targets:
+        if not os.path.exists(target_path):
+            print(f"错误：目标文件夹 '{target_path}' 不存在")
+            sys.exit(1)
+    
+    overlap = find_overlapping_folders(targets + ([] if args.catalog or args.manifest else sources))
+    if overlap:
+        print(f"错误：文件夹 '{overlap[0]}' 和 '{overlap[1]}' 相同或互相包含")
+        sys.exit(1)
+    
+    # 显示操作信息
+    print("文件夹重复文件清理工具")
+    print("=" * 60)
+    try:
+        algorithm = resolve_algorithm(args.algorithm, args.digest_size)
+        confirm_algorithm = resolve_algorithm(args.confirm_algorithm)
+    except ValueError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    source = args.source_folder
+    if args.manifest:
+        try:
+            source = load_manifests(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"错误：无法读取校验和清单: {e}")
+            sys.exit(1)
+        algorithm = source.algorithm
+        print(f"校验和清单（参考）: {', '.join(os.path.abspath(path) for path in args.manifest)} "
+              f"({len(source)} 个文件)")
+    elif args.catalog:
+        try:
+            source = CompactIndex.load(args.catalog)
+        except (OSError, ValueError) as e:
+            print(f"错误：无法载入目录索引: {e}")
+            sys.exit(1)
+        algorithm = source.metadata['algorithm']
+        print(f"目录索引（参考）: {os.path.abspath(args.catalog)} "
+              f"({source.metadata.get('source', '')}, {len(source)} 个文件)")
+    elif args.dedupe:
+        print(f"文件夹（内部去重）: {os.path.abspath(args.target_folder)}")
+        keep_names = {'shortest': '路径最短', 'oldest': '修改时间最早'}
+        print(f"每组保留: {''.join(f'{subdir} 中的文件，其次' for subdir in args.prefer)}"
+              f"{keep_names[args.keep]}的文件")
+    elif multiple:
+        source, target = sources, targets
+        print("文件夹优先级（从高到低，内容相同的文件保留优先级最高的一份）:")
+        for number, folder in enumerate(sources + targets, 1):
+            role = "源文件夹（参考）" if number <= len(sources) else "目标文件夹（清理）"
+            print(f"  {number}. {role}: {os.path.abspath(folder)}")
+    else:
+        print(f"源文件夹（参考）: {os.path.abspath(args.source_folder)}")
+    if not multiple:
+        target = args.target_folder
+        if not args.dedupe:
+            print(f"目标文件夹（清理）: {os.path.abspath(args.target_folder)}")
+    if args.block_size <= 0:
+        print("错误：--block-size 必须大于 0")
+        sys.exit(1)
+    
+    if args.benchmark_read:
+        print(f"读取速度测试（哈希算法 {algorithm.upper()}, 块大小 {args.block_size // 1024} KB）")
+        for folder in sources + targets:
+            if os.path.isdir(folder):
+                benchmark_read_modes(folder, algorithm, args.block_size)
+        return
+    
+    if is_checksum_algorithm(algorithm):
+        print(f"哈希算法: {algorithm.upper()}（快速预筛选，删除前用 {confirm_algorithm.upper()} 确认）")
+    else:
+        print(f"哈希算法: {algorithm.upper()}")
+    if args.verify == 'bytes':
+        print("删除前校验: 逐字节比较")
+    print(f"并行计算: {args.workers} 个{'进程' if args.backend == 'process' else '线程'}")
+    print(f"运行模式: {'实际删除' if args.execute else '试运行（不删除文件）'}")
+    
+    if not args.execute:
+        print("\n注意：当前为试运行模式，不会实际删除文件")
+        print("如需实际删除，请添加 --execute 参数")
+    
+    cache = HashCache(args.cache, args.cache_max_entries) if args.cache else None
+    # 第一次 Ctrl+C（或 SIGTERM）取消扫描，只输出已经确认的结果，不删除文件
+    control = ScanControl()
+    
+    scan_options = dict(
+        sample_size=args.sample_size,
+        cache=cache,
+        workers=args.workers,
+        backend=args.backend,
+        walk_workers=args.walk_workers,
+        confirm_algorithm=confirm_algorithm,
+        block_size=args.block_size,
+        read_mode=args.read_mode,
+        verify=args.verify,
+        trust_dir_mtime=args.trust_dir_mtime,
+        control=control
+    )
+    
+    # 执行重复文件检测和删除
+    try:
+        with cancel_on_signals(control):
+            if args.dedupe:
+                duplicate_count, deleted_count = dedupe_and_delete_duplicates(
+                    target, algorithm, not args.execute, keep=args.keep, prefer=args.prefer,
+                    manifest_path=args.write_manifest, delete_workers=args.delete_workers,
+                    prune_dirs=args.prune_empty_dirs, **scan_options)
+            else:
+                duplicate_count, deleted_count = find_and_delete_duplicates(
+                    source, 
+                    target, 
+                    algorithm, 
+                    not args.execute,
+                    stream=args.stream,
+                    manifest_path=args.write_manifest,
+                    delete_workers=args.delete_workers,
+                    prune_dirs=args.prune_empty_dirs,
+                    **scan_options
+                )
+        
+        print("\n" + "=" * 60)
+        print("操作已取消（只处理了取消前已经确认的重复文件）" if control.cancelled else "操作完成!")
+        print(f"找到重复文件: {duplicate_count} 个")
+        if args.execute:
+            print(f"成功删除: {deleted_count} 个")
+            if deleted_count < duplicate_count and not control.cancelled:
+                print(f"删除失败: {duplicate_count - deleted_count} 个")
+        print("=" * 60)
+        if control.cancelled:
+            sys.exit(1)
+        
+    except KeyboardInterrupt:
+        print("\n\n操作被用户中断")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n发生错误: {e}")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+            print(cache.summary())
+
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
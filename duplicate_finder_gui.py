@@ -6,17 +6,26 @@
 """
 
 import os
-import hashlib
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 # tkinter.dnd没有DND_FILES，这是tkinterdnd2的特性
-from pathlib import Path
 import threading
 from typing import Dict, List, Tuple
 import json
 from datetime import datetime
 import tkinterdnd2 as tkdnd
 
+from checksum_manifest import write_manifest
+from compare_and_delete_duplicates import (ALGORITHM_CHOICES, DEFAULT_WORKERS, DuplicateScanner,
+                                           find_duplicates_with)
+from file_deleter import DEFAULT_DELETE_WORKERS, BatchDeleter
+from progress import REFRESH_INTERVAL, ProgressCounters, ScanControl
+from result_view import ResultRow, SelectionModel, VirtualTreeview
+
+# 导出时按校验和清单格式写入的文件扩展名
+MANIFEST_EXTENSIONS = ('.md5', '.sha1', '.sha256', '.sha512', '.b2')
+
 
 class DuplicateFileFinderGUI:
     def __init__(self, root):
@@ -33,8 +42,25 @@ class DuplicateFileFinderGUI:
         self.source_folder = tk.StringVar()
         self.target_folder = tk.StringVar()
         self.algorithm = tk.StringVar(value="md5")
+        # 上一次扫描结果中哈希值的算法（快速校验和预筛选、目录索引或清单时与所选算法不同）
+        self.hash_algorithm = "md5"
+        self.workers = tk.IntVar(value=DEFAULT_WORKERS)
+        self.verify_bytes = tk.BooleanVar(value=False)
+        self.prune_empty_dirs = tk.BooleanVar(value=False)
         self.duplicate_files = []
+        self.selection = SelectionModel()
         self.is_scanning = False
+        # 扫描线程只更新计数器和最新一条消息，界面按 REFRESH_INTERVAL 读取
+        self.progress = ProgressCounters()
+        self._progress_message = "就绪"
+        # 暂停、继续和取消当前的扫描，每次扫描新建一个
+        self.scan_control = ScanControl()
+        # 扫描过程中陆续确认的重复文件，由 poll_progress 按 REFRESH_INTERVAL 成批加入列表
+        self._live_results = []
+        self._live_lock = threading.Lock()
+        # 正在进行的删除：后台线程把每个文件的结果放入队列，界面按 REFRESH_INTERVAL 取出
+        self.deleter = None
+        self._delete_results = queue.Queue()
         
         # 设置拖放支持
         self.root.drop_target_register(tkdnd.DND_FILES)
@@ -92,6 +118,10 @@ class DuplicateFileFinderGUI:
                                      command=self.browse_source_folder)
         source_browse_btn.grid(row=0, column=1)
         
+        source_files_btn = ttk.Button(source_frame, text="清单/索引",
+                                      command=self.browse_source_files)
+        source_files_btn.grid(row=0, column=2, padx=(5, 0))
+        
         # 添加拖放提示
         source_tip = ttk.Label(source_frame, text="(支持拖放文件夹)", 
                               font=('Arial', 8), foreground='gray')
@@ -127,25 +157,47 @@ class DuplicateFileFinderGUI:
         # 算法选择
         ttk.Label(control_frame, text="哈希算法:").grid(row=0, column=0, padx=(0, 5))
         algorithm_combo = ttk.Combobox(control_frame, textvariable=self.algorithm,
-                                     values=["md5", "sha1", "sha256"], state="readonly", width=10)
+                                     values=list(ALGORITHM_CHOICES), state="readonly", width=10)
         algorithm_combo.grid(row=0, column=1, padx=(0, 20))
         
+        # 并行线程数
+        ttk.Label(control_frame, text="并行线程:").grid(row=0, column=2, padx=(0, 5))
+        workers_spinbox = ttk.Spinbox(control_frame, from_=1, to=32, textvariable=self.workers,
+                                      state="readonly", width=5)
+        workers_spinbox.grid(row=0, column=3, padx=(0, 20))
+        
+        # 逐字节校验
+        verify_check = ttk.Checkbutton(control_frame, text="逐字节校验", variable=self.verify_bytes)
+        verify_check.grid(row=0, column=4, padx=(0, 20))
+        
+        # 删除后清理空文件夹
+        prune_check = ttk.Checkbutton(control_frame, text="清理空文件夹", variable=self.prune_empty_dirs)
+        prune_check.grid(row=0, column=5, padx=(0, 20))
+        
         # 按钮
         self.scan_button = ttk.Button(control_frame, text="开始扫描", 
                                      command=self.start_scan)
-        self.scan_button.grid(row=0, column=2, padx=5)
+        self.scan_button.grid(row=0, column=6, padx=5)
+        
+        self.pause_button = ttk.Button(control_frame, text="暂停", 
+                                      command=self.toggle_pause, state="disabled")
+        self.pause_button.grid(row=0, column=7, padx=5)
+        
+        self.cancel_button = ttk.Button(control_frame, text="取消扫描", 
+                                       command=self.cancel_scan, state="disabled")
+        self.cancel_button.grid(row=0, column=8, padx=5)
         
         self.delete_button = ttk.Button(control_frame, text="删除选中文件", 
                                        command=self.delete_selected_files, state="disabled")
-        self.delete_button.grid(row=0, column=3, padx=5)
+        self.delete_button.grid(row=0, column=9, padx=5)
         
         self.export_button = ttk.Button(control_frame, text="导出列表", 
                                        command=self.export_results, state="disabled")
-        self.export_button.grid(row=0, column=4, padx=5)
+        self.export_button.grid(row=0, column=10, padx=5)
         
         self.clear_button = ttk.Button(control_frame, text="清空结果", 
                                       command=self.clear_results)
-        self.clear_button.grid(row=0, column=5, padx=5)
+        self.clear_button.grid(row=0, column=11, padx=5)
         
     def setup_progress(self, parent):
         """设置进度条"""
@@ -153,7 +205,7 @@ class DuplicateFileFinderGUI:
         self.progress_label = ttk.Label(parent, textvariable=self.progress_var)
         self.progress_label.grid(row=4, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
         
-        self.progress_bar = ttk.Progressbar(parent, mode='indeterminate')
+        self.progress_bar = ttk.Progressbar(parent, mode='determinate', maximum=100)
         self.progress_bar.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
         
     def setup_results_area(self, parent):
@@ -184,9 +236,20 @@ class DuplicateFileFinderGUI:
         self.tree.column("修改时间", width=150, minwidth=120)
         
         # 滚动条
-        v_scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=self.tree.yview)
+        v_scrollbar = ttk.Scrollbar(results_frame, orient="vertical")
         h_scrollbar = ttk.Scrollbar(results_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        
+        # 虚拟化显示：Treeview 中只有可见的行，垂直滚动由 VirtualTreeview 处理；点击列标题排序
+        self.view = VirtualTreeview(self.tree, v_scrollbar, self.render_row)
+        self.view.enable_sorting({
+            "选择": lambda row: not row.selected,
+            "文件名": lambda row: row.name.lower(),
+            "路径": lambda row: row.path.lower(),
+            "大小": lambda row: row.size,
+            "哈希值": lambda row: row.hash,
+            "修改时间": lambda row: row.record.mtime_ns,
+        })
         
         # 布局
         self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -238,6 +301,25 @@ class DuplicateFileFinderGUI:
         if folder:
             self.source_folder.set(folder)
             
+    def browse_source_files(self):
+        """选择校验和清单（可以多选）或目录索引文件代替源文件夹"""
+        files = filedialog.askopenfilenames(
+            title="选择校验和清单或目录索引文件",
+            filetypes=[("校验和清单", "*.md5 *.sha1 *.sha256 *.sha512 *.b2 *SUMS *.txt"),
+                       ("目录索引", "*.idx"), ("所有文件", "*.*")]
+        )
+        if files:
+            # 多个清单用路径分隔符连接
+            self.source_folder.set(os.pathsep.join(files))
+    
+    def get_reference_source(self):
+        """源文件夹一栏的内容：文件夹、目录索引文件，或用路径分隔符连接的多个校验和清单"""
+        value = self.source_folder.get()
+        if os.path.exists(value):
+            return value
+        parts = [part for part in value.split(os.pathsep) if part]
+        return parts if len(parts) > 1 else value
+    
     def browse_target_folder(self):
         """浏览目标文件夹"""
         folder = filedialog.askdirectory(title="选择目标文件夹（要清理的文件夹）")
@@ -253,7 +335,9 @@ class DuplicateFileFinderGUI:
                 self.source_folder.set(folder_path)
                 self.status_var.set(f"已设置源文件夹: {os.path.basename(folder_path)}")
             else:
-                messagebox.showwarning("警告", "请拖放文件夹，不是文件")
+                # 拖放的文件作为校验和清单或目录索引
+                self.source_folder.set(os.pathsep.join(files))
+                self.status_var.set(f"已设置参考清单: {len(files)} 个文件")
     
     def on_drop_target(self, event):
         """处理目标文件夹拖放事件"""
@@ -272,8 +356,9 @@ class DuplicateFileFinderGUI:
             messagebox.showerror("错误", "请选择源文件夹和目标文件夹")
             return
             
-        if not os.path.exists(self.source_folder.get()):
-            messagebox.showerror("错误", "源文件夹不存在")
+        source = self.get_reference_source()
+        if not all(os.path.exists(path) for path in (source if isinstance(source, list) else [source])):
+            messagebox.showerror("错误", "源文件夹（或清单文件）不存在")
             return
             
         if not os.path.exists(self.target_folder.get()):
@@ -289,8 +374,15 @@ class DuplicateFileFinderGUI:
         
         # 开始扫描
         self.is_scanning = True
+        self.scan_control = ScanControl()
+        with self._live_lock:
+            self._live_results = []
         self.scan_button.config(state="disabled")
-        self.progress_bar.start()
+        self.pause_button.config(state="normal", text="暂停")
+        self.cancel_button.config(state="normal")
+        self.progress_bar['value'] = 0
+        self._progress_message = "开始扫描..."
+        self.poll_progress()
         
         # 在新线程中执行扫描
         scan_thread = threading.Thread(target=self.scan_duplicates)
@@ -300,74 +392,49 @@ class DuplicateFileFinderGUI:
     def scan_duplicates(self):
         """扫描重复文件（在后台线程中执行）"""
         try:
-            self.update_progress("正在扫描源文件夹...")
-            source_hashes = self.get_folder_file_hashes(self.source_folder.get())
-            
-            self.update_progress("正在扫描目标文件夹...")
-            target_hashes = self.get_folder_file_hashes(self.target_folder.get())
-            
-            self.update_progress("正在查找重复文件...")
-            duplicates = []
-            
-            for file_hash, file_paths in target_hashes.items():
-                if file_hash in source_hashes:
-                    for file_path in file_paths:
-                        file_info = self.get_file_info(file_path, file_hash)
-                        duplicates.append(file_info)
+            scanner = DuplicateScanner(self.algorithm.get(),
+                                       progress_callback=self.update_progress,
+                                       progress=self.progress,
+                                       control=self.scan_control,
+                                       on_duplicate=self.add_live_result,
+                                       workers=self.workers.get(),
+                                       verify='bytes' if self.verify_bytes.get() else 'none')
+            duplicate_hashes = find_duplicates_with(scanner, self.get_reference_source(),
+                                                    self.target_folder.get())
+            self.hash_algorithm = scanner.result_algorithm
             
             # 在主线程中更新UI
-            self.root.after(0, self.scan_completed, duplicates)
+            self.root.after(0, self.scan_completed, duplicate_hashes)
             
         except Exception as e:
             self.root.after(0, self.scan_error, str(e))
             
-    def get_folder_file_hashes(self, folder_path):
-        """获取文件夹中所有文件的哈希值"""
-        file_hashes = {}
-        folder_path = Path(folder_path)
-        
-        for file_path in folder_path.rglob('*'):
-            if file_path.is_file():
-                try:
-                    file_hash = self.calculate_file_hash(str(file_path))
-                    if file_hash:
-                        if file_hash not in file_hashes:
-                            file_hashes[file_hash] = []
-                        file_hashes[file_hash].append(str(file_path))
-                        
-                        # 更新进度
-                        self.update_progress(f"正在处理: {file_path.name}")
-                except Exception as e:
-                    print(f"处理文件 {file_path} 时出错: {e}")
-                    
-        return file_hashes
-        
-    def calculate_file_hash(self, file_path):
-        """计算文件哈希值"""
-        algorithm = self.algorithm.get()
-        hash_func = getattr(hashlib, algorithm)()
-        
-        try:
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_func.update(chunk)
-            return hash_func.hexdigest()
-        except Exception:
-            return ""
+    def add_live_result(self, file_hash, record):
+        """扫描线程确认了一个重复文件（只记录下来，由 flush_live_results 在主线程中加入列表）"""
+        with self._live_lock:
+            self._live_results.append((file_hash, record))
             
-    def get_file_info(self, file_path, file_hash):
-        """获取文件信息"""
-        path_obj = Path(file_path)
-        stat = path_obj.stat()
-        
-        return {
-            'path': file_path,
-            'name': path_obj.name,
-            'size': stat.st_size,
-            'hash': file_hash,
-            'mtime': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-            'selected': False
-        }
+    def flush_live_results(self):
+        """把扫描过程中新确认的重复文件一次加入列表，可以边扫描边查看和选择"""
+        with self._live_lock:
+            results, self._live_results = self._live_results, []
+        if not results:
+            return
+        rows = [ResultRow(record, file_hash) for file_hash, record in results]
+        self.view.add_rows(rows)
+        self.selection.rows_added(rows)
+        self.update_stats()
+        
+    def render_row(self, row):
+        """结果列表中一行显示的内容（只在这一行可见时调用）"""
+        return (
+            "☑" if row.selected else "☐",
+            row.name,
+            row.path,
+            self.format_file_size(row.size),
+            row.hash[:16] + "...",  # 只显示哈希值的前16位
+            row.mtime
+        )
         
     def format_file_size(self, size_bytes):
         """格式化文件大小"""
@@ -381,21 +448,80 @@ class DuplicateFileFinderGUI:
         return f"{size_bytes:.1f} {size_names[i]}"
         
     def update_progress(self, message):
-        """更新进度信息"""
-        self.root.after(0, lambda: self.progress_var.set(message))
+        """更新进度信息（由扫描线程调用，只记录最新的一条，由 poll_progress 显示）"""
+        self._progress_message = message
         
-    def scan_completed(self, duplicates):
-        """扫描完成"""
+    def poll_progress(self):
+        """扫描期间按固定频率读取进度：进度条按需要读取的字节数前进，显示读取速度和剩余时间"""
+        if not self.is_scanning:
+            return
+        self.flush_live_results()
+        if self.progress.active:
+            snapshot = self.progress.snapshot()
+            self.progress_bar['value'] = snapshot.fraction * 100
+            paused = "已暂停 - " if self.scan_control.paused else ""
+            self.progress_var.set(paused + snapshot.format())
+        else:
+            self.progress_var.set(self._progress_message)
+        self.root.after(int(REFRESH_INTERVAL * 1000), self.poll_progress)
+        
+    def toggle_pause(self):
+        """暂停或继续扫描（暂停后正在读取的文件完成，之后不再读取新的文件）"""
+        if self.scan_control.paused:
+            self.scan_control.resume()
+            self.pause_button.config(text="暂停")
+            self.status_var.set("继续扫描")
+        else:
+            self.scan_control.pause()
+            self.pause_button.config(text="继续")
+            self.status_var.set("扫描已暂停")
+            
+    def cancel_scan(self):
+        """取消扫描：等待正在读取的文件完成，显示已经确认的重复文件"""
+        self.scan_control.cancel()
+        self.pause_button.config(state="disabled", text="暂停")
+        self.cancel_button.config(state="disabled")
+        self._progress_message = "正在取消扫描，等待正在读取的文件完成..."
+        self.status_var.set("正在取消扫描")
+        
+    def scan_finished(self):
+        """扫描结束（完成、取消或出错）后恢复按钮状态"""
         self.is_scanning = False
-        self.progress_bar.stop()
         self.scan_button.config(state="normal")
-        
-        self.duplicate_files = duplicates
-        self.populate_tree()
+        self.pause_button.config(state="disabled", text="暂停")
+        self.cancel_button.config(state="disabled")
+        
+    def scan_completed(self, duplicate_hashes):
+        """扫描完成（取消时 duplicate_hashes 是取消前已经确认的部分结果）"""
+        self.scan_finished()
+        if not self.scan_control.cancelled:
+            self.progress_bar['value'] = 100
+        
+        # 列表中已经是扫描过程中陆续确认的结果，以最终结果为准增删（例如去掉之后才发现的
+        # 硬链接），已经显示的行、排列顺序和选择都保留
+        self.flush_live_results()
+        final = {record.path: (file_hash, record)
+                 for file_hash, records in duplicate_hashes.items() for record in records}
+        stale = {row for row in self.duplicate_files if row.path not in final}
+        if stale:
+            self.view.remove_rows(stale)
+            self.selection.rows_removed(stale)
+        shown = {row.path for row in self.duplicate_files}
+        missing = [ResultRow(record, file_hash) for path, (file_hash, record) in final.items()
+                   if path not in shown]
+        if missing:
+            self.view.add_rows(missing)
+            self.selection.rows_added(missing)
+        self.update_stats()
+        duplicates = self.duplicate_files
         
         if duplicates:
             self.delete_button.config(state="normal")
             self.export_button.config(state="normal")
+        if self.scan_control.cancelled:
+            self.progress_var.set(f"扫描已取消，取消前已确认 {len(duplicates)} 个重复文件")
+            self.status_var.set(f"扫描已取消，显示取消前已确认的 {len(duplicates)} 个重复文件")
+        elif duplicates:
             self.progress_var.set(f"扫描完成，找到 {len(duplicates)} 个重复文件")
             self.status_var.set(f"找到 {len(duplicates)} 个重复文件")
         else:
@@ -404,38 +530,22 @@ class DuplicateFileFinderGUI:
             
     def scan_error(self, error_message):
         """扫描出错"""
-        self.is_scanning = False
-        self.progress_bar.stop()
-        self.scan_button.config(state="normal")
+        self.scan_finished()
+        self.progress_bar['value'] = 0
         self.progress_var.set("扫描出错")
         messagebox.showerror("扫描错误", f"扫描过程中出现错误:\n{error_message}")
         
     def populate_tree(self):
-        """填充树形控件"""
-        # 清空现有项目
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # 添加重复文件
-        for file_info in self.duplicate_files:
-            checkbox = "☐"  # 未选中的复选框
-            values = (
-                checkbox,
-                file_info['name'],
-                file_info['path'],
-                self.format_file_size(file_info['size']),
-                file_info['hash'][:16] + "...",  # 只显示哈希值的前16位
-                file_info['mtime']
-            )
-            self.tree.insert("", "end", values=values)
-            
+        """填充树形控件（只创建可见的行，见 VirtualTreeview）"""
+        self.selection.set_rows(self.duplicate_files)
+        self.view.set_rows(self.duplicate_files)
         self.update_stats()
         
     def update_stats(self):
-        """更新统计信息"""
+        """更新统计信息（选中数量和大小由 SelectionModel 随时维护，不再重新统计）"""
         total = len(self.duplicate_files)
-        selected = sum(1 for f in self.duplicate_files if f['selected'])
-        total_size = sum(f['size'] for f in self.duplicate_files if f['selected'])
+        selected = self.selection.count
+        total_size = self.selection.bytes
         
         stats_text = f"统计: {total} 个重复文件, {selected} 个已选中"
         if selected > 0:
@@ -478,15 +588,13 @@ class DuplicateFileFinderGUI:
     def toggle_selection(self, item):
         """切换选择状态"""
         try:
-            index = self.tree.index(item)
-            file_info = self.duplicate_files[index]
-            file_info['selected'] = not file_info['selected']
+            file_info = self.view.row_at(item)
+            if file_info is None:
+                return
+            self.selection.toggle(file_info)
             
             # 更新显示
-            checkbox = "☑" if file_info['selected'] else "☐"
-            values = list(self.tree.item(item, "values"))
-            values[0] = checkbox
-            self.tree.item(item, values=values)
+            self.view.refresh()
             
             self.update_stats()
         except (IndexError, tk.TclError):
@@ -494,44 +602,32 @@ class DuplicateFileFinderGUI:
             
     def select_all(self):
         """全选"""
-        for i, file_info in enumerate(self.duplicate_files):
-            file_info['selected'] = True
-            item = self.tree.get_children()[i]
-            values = list(self.tree.item(item, "values"))
-            values[0] = "☑"
-            self.tree.item(item, values=values)
+        self.selection.select_all()
+        self.view.refresh()
         self.update_stats()
         
     def deselect_all(self):
         """全不选"""
-        for i, file_info in enumerate(self.duplicate_files):
-            file_info['selected'] = False
-            item = self.tree.get_children()[i]
-            values = list(self.tree.item(item, "values"))
-            values[0] = "☐"
-            self.tree.item(item, values=values)
+        self.selection.deselect_all()
+        self.view.refresh()
         self.update_stats()
         
     def invert_selection(self):
         """反选"""
-        for i, file_info in enumerate(self.duplicate_files):
-            file_info['selected'] = not file_info['selected']
-            item = self.tree.get_children()[i]
-            values = list(self.tree.item(item, "values"))
-            values[0] = "☑" if file_info['selected'] else "☐"
-            self.tree.item(item, values=values)
+        self.selection.invert()
+        self.view.refresh()
         self.update_stats()
         
     def delete_selected_files(self):
         """删除选中的文件"""
-        selected_files = [f for f in self.duplicate_files if f['selected']]
+        selected_files = self.selection.selected_rows()
         
         if not selected_files:
             messagebox.showwarning("警告", "请先选择要删除的文件")
             return
             
         # 确认删除
-        total_size = sum(f['size'] for f in selected_files)
+        total_size = self.selection.bytes
         message = f"确定要删除 {len(selected_files)} 个文件吗？\n"
         message += f"将释放 {self.format_file_size(total_size)} 的空间。\n\n"
         message += "此操作不可撤销！"
@@ -539,35 +635,112 @@ class DuplicateFileFinderGUI:
         if not messagebox.askyesno("确认删除", message):
             return
             
-        # 执行删除
-        deleted_count = 0
-        failed_files = []
+        # 在后台线程中删除（按目录分组并行删除），界面保持响应
+        prune_within = [self.target_folder.get()] if self.prune_empty_dirs.get() else None
+        self.deleter = BatchDeleter(DEFAULT_DELETE_WORKERS, prune_within,
+                                    progress_callback=self.update_progress)
+        self._delete_results = queue.Queue()
+        self._deleting_rows = {row.path: row for row in selected_files}
+        self._delete_total = len(selected_files)
+        self._deleted_count = 0
+        self._deleted_bytes = 0
+        self._delete_failures = []
         
-        for file_info in selected_files:
+        self.scan_button.config(state="disabled")
+        self.delete_button.config(state="disabled")
+        self.export_button.config(state="disabled")
+        self.clear_button.config(state="disabled")
+        self.cancel_button.config(text="取消删除", command=self.cancel_delete, state="normal")
+        self.progress_bar['value'] = 0
+        self.progress_var.set(f"正在删除 {self._delete_total} 个文件...")
+        
+        delete_thread = threading.Thread(target=self.run_deletion,
+                                         args=(self.deleter, list(self._deleting_rows)))
+        delete_thread.daemon = True
+        delete_thread.start()
+        self.poll_deletion()
+        
+    def run_deletion(self, deleter, file_paths):
+        """删除文件（在后台线程中执行），每个文件的结果放入队列，最后放入 None"""
+        try:
+            for path, error in deleter.run(file_paths):
+                self._delete_results.put((path, error))
+        except Exception as e:
+            self._delete_results.put((None, str(e)))
+        finally:
+            self._delete_results.put(None)
+            
+    def poll_deletion(self):
+        """取出后台线程的删除结果：已删除的行立即从列表中去掉，显示进度和已释放的空间"""
+        removed = set()
+        finished = False
+        while True:
             try:
-                os.remove(file_info['path'])
-                deleted_count += 1
-            except Exception as e:
-                failed_files.append(f"{file_info['name']}: {str(e)}")
-                
-        # 更新结果
-        self.duplicate_files = [f for f in self.duplicate_files if not f['selected']]
-        self.populate_tree()
+                result = self._delete_results.get_nowait()
+            except queue.Empty:
+                break
+            if result is None:
+                finished = True
+                break
+            path, error = result
+            # 删除失败的文件也算处理完成，但保留在列表中
+            row = self._deleting_rows.pop(path, None)
+            if error is not None:
+                name = os.path.basename(path) if path else "删除出错"
+                self._delete_failures.append(f"{name}: {error}")
+                continue
+            removed.add(row)
+            self._deleted_count += 1
+            self._deleted_bytes += row.size
+            
+        if removed:
+            self.view.remove_rows(removed)
+            self.selection.rows_removed(removed)
+            self.update_stats()
+        
+        done = self._delete_total - len(self._deleting_rows)
+        self.progress_bar['value'] = done / self._delete_total * 100
+        self.progress_var.set(f"已删除 {self._deleted_count}/{self._delete_total} 个文件，"
+                              f"已释放 {self.format_file_size(self._deleted_bytes)}"
+                              + ("，正在取消..." if self.deleter.cancelled else ""))
+        if finished:
+            self.deletion_finished()
+        else:
+            self.root.after(int(REFRESH_INTERVAL * 1000), self.poll_deletion)
+            
+    def cancel_delete(self):
+        """取消删除：正在删除的那几批完成后停止，其余文件保留"""
+        if self.deleter is not None:
+            self.deleter.cancel()
+        self.cancel_button.config(state="disabled")
+        
+    def deletion_finished(self):
+        """删除结束（完成或取消）"""
+        deleter = self.deleter
+        self.deleter = None
+        self._deleting_rows = {}
+        self.cancel_button.config(text="取消扫描", command=self.cancel_scan, state="disabled")
+        self.scan_button.config(state="normal")
+        self.clear_button.config(state="normal")
+        if self.duplicate_files:
+            self.delete_button.config(state="normal")
+            self.export_button.config(state="normal")
+        self.progress_var.set(deleter.summary())
         
         # 显示结果
+        deleted_count = len(deleter.deleted)
+        failed_files = self._delete_failures
+        freed = self.format_file_size(self._deleted_bytes)
+        title = "删除已取消" if deleter.cancelled else "删除完成"
         if failed_files:
-            message = f"成功删除 {deleted_count} 个文件\n"
+            message = f"成功删除 {deleted_count} 个文件，释放 {freed}\n"
             message += f"删除失败 {len(failed_files)} 个文件:\n"
             message += "\n".join(failed_files[:5])  # 只显示前5个失败的文件
             if len(failed_files) > 5:
                 message += f"\n... 还有 {len(failed_files) - 5} 个文件删除失败"
-            messagebox.showwarning("删除完成", message)
+            messagebox.showwarning(title, message)
         else:
-            messagebox.showinfo("删除完成", f"成功删除 {deleted_count} 个文件")
-            
-        if not self.duplicate_files:
-            self.delete_button.config(state="disabled")
-            self.export_button.config(state="disabled")
+            messagebox.showinfo(title, f"成功删除 {deleted_count} 个文件，释放 {freed}")
             
     def export_results(self):
         """导出结果到文件"""
@@ -578,7 +751,8 @@ class DuplicateFileFinderGUI:
         file_path = filedialog.asksaveasfilename(
             title="导出重复文件列表",
             defaultextension=".json",
-            filetypes=[("JSON文件", "*.json"), ("文本文件", "*.txt"), ("所有文件", "*.*")]
+            filetypes=[("JSON文件", "*.json"), ("文本文件", "*.txt"),
+                       ("校验和清单", "*.md5 *.sha1 *.sha256 *.sha512 *.b2"), ("所有文件", "*.*")]
         )
         
         if not file_path:
@@ -587,7 +761,12 @@ class DuplicateFileFinderGUI:
         try:
             if file_path.endswith('.json'):
                 with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.duplicate_files, f, ensure_ascii=False, indent=2)
+                    json.dump([row.to_dict() for row in self.duplicate_files], f,
+                              ensure_ascii=False, indent=2)
+            elif os.path.splitext(file_path)[1].lower() in MANIFEST_EXTENSIONS:
+                # md5sum/sha256sum 格式，逐字节比较得到的分组没有哈希值，不写入
+                write_manifest(file_path, ((f.hash, f.path) for f in self.duplicate_files
+                                           if not f.hash.startswith('size:')), self.hash_algorithm)
             else:
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write("重复文件列表\n")
@@ -595,16 +774,16 @@ class DuplicateFileFinderGUI:
                     f.write(f"扫描时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                     f.write(f"源文件夹: {self.source_folder.get()}\n")
                     f.write(f"目标文件夹: {self.target_folder.get()}\n")
-                    f.write(f"哈希算法: {self.algorithm.get().upper()}\n")
+                    f.write(f"哈希算法: {self.hash_algorithm.upper()}\n")
                     f.write(f"重复文件数量: {len(self.duplicate_files)}\n\n")
                     
                     for i, file_info in enumerate(self.duplicate_files, 1):
-                        f.write(f"{i}. {file_info['name']}\n")
-                        f.write(f"   路径: {file_info['path']}\n")
-                        f.write(f"   大小: {self.format_file_size(file_info['size'])}\n")
-                        f.write(f"   哈希: {file_info['hash']}\n")
-                        f.write(f"   修改时间: {file_info['mtime']}\n")
-                        f.write(f"   已选中: {'是' if file_info['selected'] else '否'}\n\n")
+                        f.write(f"{i}. {file_info.name}\n")
+                        f.write(f"   路径: {file_info.path}\n")
+                        f.write(f"   大小: {self.format_file_size(file_info.size)}\n")
+                        f.write(f"   哈希: {file_info.hash}\n")
+                        f.write(f"   修改时间: {file_info.mtime}\n")
+                        f.write(f"   已选中: {'是' if file_info.selected else '否'}\n\n")
                         
             messagebox.showinfo("导出成功", f"结果已导出到:\n{file_path}")
             
@@ -614,13 +793,15 @@ class DuplicateFileFinderGUI:
     def clear_results(self):
         """清空结果"""
         self.duplicate_files = []
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.view.clear()
+        # 列表、选择和视图共用同一个列表对象，之后陆续加入的结果三者都能看到
+        self.populate_tree()
         self.delete_button.config(state="disabled")
         self.export_button.config(state="disabled")
         self.stats_var.set("统计: 0 个重复文件")
         self.status_var.set("就绪")
         self.progress_var.set("就绪")
+        self.progress_bar['value'] = 0
         
     def show_context_menu(self, event):
         """显示右键菜单"""
@@ -634,8 +815,7 @@ class DuplicateFileFinderGUI:
         selection = self.tree.selection()
         if selection:
             try:
-                index = self.tree.index(selection[0])
-                file_path = self.duplicate_files[index]['path']
+                file_path = self.view.row_at(selection[0]).path
                 os.startfile(file_path)
             except Exception as e:
                 messagebox.showerror("错误", f"无法打开文件:\n{str(e)}")
@@ -645,8 +825,7 @@ class DuplicateFileFinderGUI:
         selection = self.tree.selection()
         if selection:
             try:
-                index = self.tree.index(selection[0])
-                file_path = self.duplicate_files[index]['path']
+                file_path = self.view.row_at(selection[0]).path
                 folder_path = os.path.dirname(file_path)
                 os.startfile(folder_path)
             except Exception as e:
@@ -657,8 +836,7 @@ class DuplicateFileFinderGUI:
         selection = self.tree.selection()
         if selection:
             try:
-                index = self.tree.index(selection[0])
-                file_path = self.duplicate_files[index]['path']
+                file_path = self.view.row_at(selection[0]).path
                 self.root.clipboard_clear()
                 self.root.clipboard_append(file_path)
                 self.status_var.set("文件路径已复制到剪贴板")
@@ -670,8 +848,7 @@ class DuplicateFileFinderGUI:
         selection = self.tree.selection()
         if selection:
             try:
-                index = self.tree.index(selection[0])
-                file_info = self.duplicate_files[index]
+                file_info = self.view.row_at(selection[0])
                 
                 # 创建属性窗口
                 prop_window = tk.Toplevel(self.root)
@@ -680,12 +857,12 @@ class DuplicateFileFinderGUI:
                 prop_window.resizable(False, False)
                 
                 # 属性信息
-                info_text = f"""文件名: {file_info['name']}
-路径: {file_info['path']}
-大小: {self.format_file_size(file_info['size'])} ({file_info['size']:,} 字节)
-修改时间: {file_info['mtime']}
-哈希值 ({self.algorithm.get().upper()}): {file_info['hash']}
-选中状态: {'是' if file_info['selected'] else '否'}"""
+                info_text = f"""文件名: {file_info.name}
+路径: {file_info.path}
+大小: {self.format_file_size(file_info.size)} ({file_info.size:,} 字节)
+修改时间: {file_info.mtime}
+哈希值 ({self.algorithm.get().upper()}): {file_info.hash}
+选中状态: {'是' if file_info.selected else '否'}"""
                 
                 text_widget = scrolledtext.ScrolledText(prop_window, wrap=tk.WORD, 
                                                        width=60, height=15)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量删除文件
+按所在目录分组，在线程池中并行删除；支持 dir_fd 的系统上每组只打开一次目录，
+之后相对于目录的文件描述符删除，不再逐个解析完整路径（网络文件系统上每次路径解析
+都是一次往返）。可以在同一遍中自底向上删除因此变空的文件夹。
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 默认的删除线程数：删除几乎不占 CPU，主要是等待文件系统（尤其是网络文件系统）响应
+DEFAULT_DELETE_WORKERS = 8
+
+# 同一个目录中的文件每批最多删除的数量，文件很多的目录会拆成多批并行删除
+DELETE_BATCH_SIZE = 256
+
+# 两次进度消息之间的最短间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# os.unlink 是否支持 dir_fd（Windows 不支持）
+_USE_DIR_FD = os.unlink in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+
+
+def _unlink_batch(directory: str, batch: List[Tuple[str, str]]) -> List[Tuple[str, Optional[str]]]:
+    """删除同一个目录中的一批文件，返回 (路径, 错误信息或 None)"""
+    results = []
+    dir_fd = None
+    if _USE_DIR_FD:
+        try:
+            dir_fd = os.open(directory or os.curdir, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            # 目录无法打开时逐个按完整路径删除，每个文件各自报告错误
+            dir_fd = None
+    try:
+        for path, name in batch:
+            try:
+                if dir_fd is None:
+                    os.remove(path)
+                else:
+                    os.unlink(name, dir_fd=dir_fd)
+                results.append((path, None))
+            except OSError as e:
+                results.append((path, e.strerror or str(e)))
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return results
+
+
+def prune_empty_dirs(directory: str, roots: Sequence[str]) -> List[str]:
+    """
+    从 directory 开始自底向上删除空文件夹，直到遇到非空文件夹或 roots 中的文件夹
+    （roots 本身及其之外的文件夹不删除）
+
+    Returns:
+        删除的文件夹，由深到浅
+    """
+    roots = [os.path.abspath(root) for root in roots]
+    directory = os.path.abspath(directory)
+    removed = []
+    while any(directory != root and directory.startswith(os.path.join(root, '')) for root in roots):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # 不为空（或者其中还有文件正在被其他线程删除，那一批完成后会再次尝试）
+            break
+        removed.append(directory)
+        directory = os.path.dirname(directory)
+    return removed
+
+
+class BatchDeleter:
+    """
+    并行批量删除文件
+
+    run() 按完成顺序逐个返回删除结果，删除过程中可以随时处理（例如更新界面）；
+    结束后 deleted、failed、removed_dirs 中是全部结果，summary() 给出吞吐量。
+    cancel() 可以在其他线程中调用：不再开始新的批次，已经开始的批次删除完成后 run() 结束。
+    """
+
+    def __init__(self, workers: int = DEFAULT_DELETE_WORKERS,
+                 prune_within: Optional[Sequence[str]] = None,
+                 progress_callback: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            workers: 并行删除的线程数
+            prune_within: 删除后清理这些文件夹内部变空的子文件夹（文件夹本身保留）；
+                          None 表示不清理
+            progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+        """
+        self.workers = max(1, workers)
+        self.prune_roots = [os.path.abspath(root) for root in prune_within or ()]
+        self.report = progress_callback or print
+        self.deleted: List[str] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.removed_dirs: List[str] = []
+        self.elapsed = 0.0
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """停止删除（线程安全）：已经开始的批次仍会完成并返回结果"""
+        self._cancelled.set()
+
+    @property
+    def rate(self) -> float:
+        """每秒删除的文件数"""
+        return len(self.deleted) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def run(self, file_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        删除文件
+
+        Yields:
+            元组：(文件路径, 错误信息)，删除成功时错误信息为 None
+        """
+        batches = []
+        groups: Dict[str, List[Tuple[str, str]]] = {}
+        for path in file_paths:
+            directory, name = os.path.split(path)
+            groups.setdefault(directory, []).append((path, name))
+        remaining: Dict[str, int] = {}
+        for directory, entries in groups.items():
+            for start in range(0, len(entries), DELETE_BATCH_SIZE):
+                batches.append((directory, entries[start:start + DELETE_BATCH_SIZE]))
+            remaining[directory] = (len(entries) + DELETE_BATCH_SIZE - 1) // DELETE_BATCH_SIZE
+        total = sum(len(entries) for entries in groups.values())
+
+        started = time.monotonic()
+        next_report = started + PROGRESS_INTERVAL
+        done = 0
+        pending = {}
+        batch_iter = iter(batches)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                # 同时最多只有 workers * 2 批在排队或执行
+                while len(pending) < self.workers * 2 and not self._cancelled.is_set():
+                    batch = next(batch_iter, None)
+                    if batch is None:
+                        break
+                    pending[executor.submit(_unlink_batch, *batch)] = batch[0]
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    directory = pending.pop(future)
+                    for path, error in future.result():
+                        done += 1
+                        if error is None:
+                            self.deleted.append(path)
+                        else:
+                            self.failed.append((path, error))
+                        yield path, error
+                    remaining[directory] -= 1
+                    if remaining[directory] == 0 and self.prune_roots:
+                        self.removed_dirs.extend(prune_empty_dirs(directory, self.prune_roots))
+                now = time.monotonic()
+                if now >= next_report and done < total:
+                    next_report = now + PROGRESS_INTERVAL
+                    self.report(f"已删除 {done}/{total} 个文件 "
+                                f"({len(self.deleted) / (now - started):.0f} 个/秒)")
+        self.elapsed = time.monotonic() - started
+
+    def summary(self) -> str:
+        text = (f"删除 {len(self.deleted)} 个文件，用时 {self.elapsed:.1f} 秒 "
+                f"({self.rate:.0f} 个/秒)")
+        if self.failed:
+            text += f"，{len(self.failed)} 个删除失败"
+        if self.removed_dirs:
+            text += f"，清理 {len(self.removed_dirs)} 个空文件夹"
+        if self.cancelled:
+            text += "（已取消，其余文件没有删除）"
+        return text
+
+
+def delete_files(file_paths: Iterable[str], workers: int = DEFAULT_DELETE_WORKERS,
+                 prune_within: Optional[Sequence[str]] = None,
+                 progress_callback: Optional[Callable[[str], None]] = None) -> BatchDeleter:
+    """
+    并行删除文件，返回结束后的 BatchDeleter（deleted、failed、removed_dirs、summary()）
+
+    Args:
+        file_paths: 要删除的文件路径
+        workers: 并行删除的线程数
+        prune_within: 删除后清理这些文件夹内部变空的子文件夹；None 表示不清理
+        progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+    """
+    deleter = BatchDeleter(workers, prune_within, progress_callback)
+    for _ in deleter.run(file_paths):
+        pass
+    return deleter
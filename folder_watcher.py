@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹监视
+Linux 上通过 ctypes 直接调用 inotify（不需要额外依赖），监视文件夹及其所有子文件夹中
+写入完成（IN_CLOSE_WRITE）、新建或移入的文件；其他系统或 inotify 不可用时改为定期
+遍历文件夹，比较文件的大小和修改时间
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 文件最后一次变化之后要等待的秒数，之后才认为写入已经完成
+DEFAULT_DEBOUNCE = 2.0
+
+# 轮询模式下两次遍历文件夹的间隔（秒）
+DEFAULT_POLL_INTERVAL = 5.0
+
+# 等待处理的文件最多排队的数量，队列满时监视线程等待（inotify 事件暂时留在内核中）
+DEFAULT_QUEUE_SIZE = 1000
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _walk(folder: str) -> Iterator[Tuple[str, List[str], List[os.stat_result]]]:
+    """遍历文件夹：每个目录返回 (目录, 文件路径列表, 对应的 stat 结果)，不进入符号链接"""
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        paths, stats = [], []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file():
+                            stats.append(entry.stat())
+                            paths.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        yield directory, paths, stats
+
+
+class InotifyWatcher:
+    """用 inotify 递归监视一个文件夹，返回发生变化的文件路径"""
+
+    def __init__(self, folder: str, report: Callable[[str], None]):
+        """
+        Raises:
+            OSError: 不是 Linux、inotify 不可用，或者监视数量超过系统上限
+                     （fs.inotify.max_user_watches）
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify 只在 Linux 上可用")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.folder = folder
+        self.report = report
+        self._paths: Dict[int, str] = {}
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        try:
+            for directory, _, _ in _walk(folder):
+                self._add_watch(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # 目录刚刚被删除或者没有权限，忽略
+                return
+            raise OSError(error, f"无法监视 {directory}: {os.strerror(error)}")
+        # 同一个目录（例如被重命名后）再次添加时返回原来的 wd，这里顺便更新路径
+        self._paths[wd] = directory
+
+    def read_events(self, timeout: float) -> List[str]:
+        """
+        等待最多 timeout 秒，返回发生变化的文件路径
+
+        新建或移入的子文件夹会立即加入监视，并返回其中已有的文件（添加监视之前
+        写入的文件不会产生事件）；内核事件队列溢出时返回整个文件夹的所有文件。
+        """
+        readable, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not readable:
+            return []
+        data = os.read(self._fd, 1024 * 1024)
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.report("inotify 事件队列溢出，重新遍历整个文件夹")
+                return self._rescan(self.folder)
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self._rescan(path))
+            else:
+                changed.append(path)
+        return changed
+
+    def _rescan(self, folder: str) -> List[str]:
+        """为 folder 下的所有子文件夹添加监视，返回其中已有的文件"""
+        files = []
+        for directory, paths, _ in _walk(folder):
+            self._add_watch(directory)
+            files.extend(paths)
+        return files
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    定期遍历文件夹，返回新出现或发生变化的文件路径
+
+    文件的 (大小, 修改时间) 在相隔至少 debounce 秒的两次遍历中保持不变才返回，
+    所以返回的文件已经写入完成，不需要再等待。启动时已经存在的文件不返回。
+    """
+
+    def __init__(self, folder: str, interval: float, debounce: float):
+        self.folder = folder
+        self.interval = interval
+        self.debounce = debounce
+        self._known = self._snapshot()
+        self._unstable: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self._next_poll = time.monotonic() + interval
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        return {path: (stat.st_size, stat.st_mtime_ns)
+                for _, paths, stats in _walk(self.folder)
+                for path, stat in zip(paths, stats)}
+
+    def read_events(self, timeout: float) -> List[str]:
+        remaining = self._next_poll - time.monotonic()
+        if remaining > timeout:
+            time.sleep(max(timeout, 0))
+            return []
+        time.sleep(max(remaining, 0))
+        self._next_poll = time.monotonic() + self.interval
+
+        now = time.monotonic()
+        current = self._snapshot()
+        changed = []
+        for path, signature in current.items():
+            if self._known.get(path) == signature:
+                continue
+            previous = self._unstable.get(path)
+            if previous is not None and previous[0] == signature:
+                if now - previous[1] >= self.debounce:
+                    del self._unstable[path]
+                    self._known[path] = signature
+                    changed.append(path)
+            else:
+                self._unstable[path] = (signature, now)
+        self._known = {path: signature for path, signature in self._known.items() if path in current}
+        self._unstable = {path: state for path, state in self._unstable.items() if path in current}
+        return changed
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    监视文件夹，把写入完成的新文件放入有界队列，迭代 FolderWatcher 就能依次取得
+
+    inotify 模式下，一个文件在 debounce 秒内没有新的事件才认为写入完成（同一个文件
+    的多次事件合并为一次）；轮询模式由 PollingWatcher 自己判断文件是否稳定。
+    处理速度跟不上时队列会满，监视线程随之等待，待处理的文件不会无限增长。
+    """
+
+    def __init__(self, folder: str, debounce: float = DEFAULT_DEBOUNCE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True,
+                 progress_callback: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            folder: 要监视的文件夹
+            debounce: 文件最后一次变化之后等待的秒数
+            queue_size: 等待处理的文件最多排队的数量
+            poll_interval: 轮询模式下两次遍历的间隔（秒）
+            use_inotify: 优先使用 inotify；False 或 inotify 不可用时使用轮询
+            progress_callback: 进度回调，接收一条进度消息（默认打印到控制台）
+        """
+        self.folder = os.fspath(folder)
+        self.debounce = debounce
+        self.report = progress_callback or print
+        self._ready: "queue.Queue[str]" = queue.Queue(maxsize=max(1, queue_size))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.source = None
+        if use_inotify:
+            try:
+                self.source = InotifyWatcher(self.folder, self.report)
+                self.mode = 'inotify'
+            except (OSError, AttributeError) as e:
+                self.report(f"无法使用 inotify（{e}），改为每 {poll_interval:g} 秒轮询一次")
+        if self.source is None:
+            self.source = PollingWatcher(self.folder, poll_interval, debounce)
+            self.mode = 'polling'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        pending: Dict[str, float] = {}
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = min(pending.values()) - now if pending else 0.5
+                for path in self.source.read_events(min(max(timeout, 0), 0.5)):
+                    if self.mode == 'polling':
+                        self._put(path)
+                    else:
+                        pending[path] = time.monotonic() + self.debounce
+                now = time.monotonic()
+                for path in [path for path, deadline in pending.items() if deadline <= now]:
+                    del pending[path]
+                    self._put(path)
+        except Exception as e:
+            self.report(f"监视文件夹 {self.folder} 时出错: {e}")
+            self._stop.set()
+        finally:
+            self.source.close()
+
+    def _put(self, path: str):
+        while not self._stop.is_set():
+            try:
+                self._ready.put(path, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    @property
+    def stopped(self) -> bool:
+        """监视已经停止，并且队列中的文件都已取出"""
+        return self._stop.is_set() and self._ready.empty()
+
+    def get(self, timeout: float = 0.5) -> Optional[str]:
+        """取出下一个写入完成的文件，timeout 秒内没有新文件时返回 None"""
+        try:
+            return self._ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __iter__(self) -> Iterator[str]:
+        while not self.stopped:
+            path = self.get()
+            if path is not None:
+                yield path
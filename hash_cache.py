@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化哈希值缓存
+把文件哈希值保存在 SQLite 数据库中，文件的 (设备号, inode, 大小, 修改时间, 算法)
+没有变化时直接复用上次的结果，不再读取文件内容。
+还可以保存每个目录的内容（--trust-dir-mtime），目录的修改时间没有变化时直接
+复用上次的文件列表，不再遍历这个目录
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+# 缓存条目数量上限的默认值
+DEFAULT_MAX_ENTRIES = 2000000
+
+# 修改时间距离现在不足这么多纳秒的文件不写入缓存，
+# 避免同一时间戳内再次被修改的文件被误判为未变化
+RECENT_MTIME_NS = 2 * 10 ** 9
+
+
+class HashCache:
+    """基于 SQLite 的文件哈希值缓存"""
+
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            db_path: 缓存数据库文件路径（不存在时自动创建）
+            max_entries: 最多保留的条目数量，超出时淘汰最久未使用的条目
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.run_id = int(time.time())
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._touched = []
+        self._pending_dirs = []
+        self._seen_dirs = set()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT NOT NULL,
+                algorithm TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                last_seen INTEGER NOT NULL,
+                PRIMARY KEY (path, algorithm)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_seen ON file_hashes (last_seen)")
+        # 每个目录上次扫描时的修改时间、条目数量、条目列表（JSON）及其摘要
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dir_states (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                entry_count INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                entries TEXT NOT NULL,
+                last_seen INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, record, algorithm: str) -> Optional[str]:
+        """
+        查询缓存的哈希值
+
+        Args:
+            record: 文件记录（需要 path、size、mtime_ns、ino、dev 属性）
+            algorithm: 哈希算法（采样哈希使用不同的算法名区分）
+
+        Returns:
+            缓存的哈希值；文件不在缓存中或已变化时返回 None
+        """
+        path = os.path.abspath(record.path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dev, ino, size, mtime_ns, digest FROM file_hashes "
+                "WHERE path = ? AND algorithm = ?", (path, algorithm)).fetchone()
+            if row and row[:4] == (record.dev, record.ino, record.size, record.mtime_ns):
+                self.hits += 1
+                self._touched.append((self.run_id, path, algorithm))
+                return row[4]
+            self.misses += 1
+            return None
+
+    def put(self, record, algorithm: str, digest: str):
+        """
+        保存文件的哈希值（批量写入，close 或 flush 时落盘）
+
+        Args:
+            record: 计算哈希值之前取得的文件记录
+            algorithm: 哈希算法
+            digest: 哈希值
+        """
+        if time.time() * 10 ** 9 - record.mtime_ns < RECENT_MTIME_NS:
+            return
+        with self._lock:
+            self._pending.append((os.path.abspath(record.path), algorithm, record.dev,
+                                  record.ino, record.size, record.mtime_ns,
+                                  digest, self.run_id))
+            if len(self._pending) >= 10000:
+                self._flush_locked()
+
+    def get_directory(self, dir_path: str,
+                      mtime_ns: int) -> Optional[Tuple[List[str], List[Tuple[str, int, int, int, int, int]]]]:
+        """
+        查询上次扫描时保存的目录内容
+
+        Args:
+            dir_path: 目录路径
+            mtime_ns: 目录当前的修改时间
+
+        Returns:
+            (子目录名列表, 文件条目列表)，文件条目为 (文件名, 大小, 修改时间, inode, 设备号, 硬链接数)；
+            没有保存过、目录的修改时间已变化或者保存的内容损坏时返回 None
+        """
+        path = os.path.abspath(dir_path)
+        with self._lock:
+            self._seen_dirs.add(path)
+            row = self._conn.execute(
+                "SELECT mtime_ns, entry_count, digest, entries FROM dir_states WHERE path = ?",
+                (path,)).fetchone()
+            if row is None or row[0] != mtime_ns or _entries_digest(row[3]) != row[2]:
+                self.dir_misses += 1
+                return None
+            sub_dirs, files = json.loads(row[3])
+            if len(sub_dirs) + len(files) != row[1]:
+                self.dir_misses += 1
+                return None
+            self.dir_hits += 1
+        return sub_dirs, [tuple(entry) for entry in files]
+
+    def put_directory(self, dir_path: str, mtime_ns: int, sub_dirs: List[str],
+                      files: List[Tuple[str, int, int, int, int, int]]):
+        """
+        保存目录的内容（批量写入）；修改时间离现在太近的目录不保存
+
+        Args:
+            dir_path: 目录路径
+            mtime_ns: 遍历之前取得的目录修改时间
+            sub_dirs: 子目录名列表
+            files: 文件条目列表，格式见 get_directory
+        """
+        if time.time() * 10 ** 9 - mtime_ns < RECENT_MTIME_NS:
+            return
+        entries = json.dumps([sub_dirs, files], separators=(',', ':'))
+        with self._lock:
+            self._pending_dirs.append((os.path.abspath(dir_path), mtime_ns, len(sub_dirs) + len(files),
+                                       _entries_digest(entries), entries, self.run_id))
+            if len(self._pending_dirs) >= 10000:
+                self._flush_locked()
+
+    def flush(self):
+        """把待写入的条目写入数据库"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes "
+                "(path, algorithm, dev, ino, size, mtime_ns, digest, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+        if self._pending_dirs:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dir_states "
+                "(path, mtime_ns, entry_count, digest, entries, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)", self._pending_dirs)
+            self._pending_dirs = []
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE file_hashes SET last_seen = ? WHERE path = ? AND algorithm = ?",
+                self._touched)
+            self._touched = []
+        self._conn.commit()
+
+    def prune_missing(self, folder_path: str, present_paths: Iterable[str]) -> int:
+        """
+        删除某个文件夹下已经不存在的文件的缓存条目；本次运行使用过目录状态时，
+        也删除这个文件夹下本次没有遍历到的目录的状态
+
+        Args:
+            folder_path: 刚刚完整扫描过的文件夹
+            present_paths: 本次扫描中该文件夹下存在的所有文件
+
+        Returns:
+            删除的条目数量
+        """
+        root = os.path.join(os.path.abspath(folder_path), '')
+        present = {os.path.abspath(path) for path in present_paths}
+        with self._lock:
+            self._flush_locked()
+            # 路径前缀范围查询：root 与 root 最后一个字符加一之间
+            upper = root[:-1] + chr(ord(root[-1]) + 1)
+            stale = [(path,) for (path,) in self._conn.execute(
+                "SELECT DISTINCT path FROM file_hashes WHERE path >= ? AND path < ?",
+                (root, upper)) if path not in present]
+            self._conn.executemany("DELETE FROM file_hashes WHERE path = ?", stale)
+            if self._seen_dirs:
+                stale_dirs = [(path,) for (path,) in self._conn.execute(
+                    "SELECT path FROM dir_states WHERE path >= ? AND path < ?", (root, upper))
+                    if path not in self._seen_dirs]
+                self._conn.executemany("DELETE FROM dir_states WHERE path = ?", stale_dirs)
+            self._conn.commit()
+            self.evicted += len(stale)
+            return len(stale)
+
+    def enforce_limit(self) -> int:
+        """
+        条目数量超过上限时淘汰最久未使用的条目
+
+        Returns:
+            删除的条目数量
+        """
+        with self._lock:
+            self._flush_locked()
+            count = self._conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM file_hashes WHERE rowid IN "
+                "(SELECT rowid FROM file_hashes ORDER BY last_seen LIMIT ?)", (excess,))
+            self._conn.commit()
+            self.evicted += excess
+            return excess
+
+    def close(self):
+        """写入剩余条目、执行容量限制并关闭数据库"""
+        if self._conn is None:
+            return
+        self.enforce_limit()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    def summary(self) -> str:
+        """返回命中统计信息"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        text = (f"哈希缓存: 命中 {self.hits} 个, 未命中 {self.misses} 个 "
+                f"(命中率 {rate:.1f}%), 清理 {self.evicted} 个过期条目")
+        if self.dir_hits or self.dir_misses:
+            text += f"\n目录状态: {self.dir_hits} 个目录未变化直接复用, {self.dir_misses} 个目录重新遍历"
+        return text
+
+
+def _entries_digest(entries: str) -> str:
+    """目录条目列表的摘要，用来发现损坏或被改动过的目录状态"""
+    return hashlib.blake2b(entries.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
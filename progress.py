@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描进度和控制
+遍历线程、协调线程和哈希工作线程只增加 ProgressCounters 中的计数器，不再为每个文件
+发送一条进度消息；界面或命令行按固定频率调用 snapshot() 读取，得到进度比例、读取速度
+和预计剩余时间。ConsoleProgress 在命令行中把进度显示在同一行上。
+ScanControl 用来暂停、继续和取消正在进行的扫描。
+"""
+
+import shutil
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, TypeVar
+
+T = TypeVar('T')
+
+# 界面和命令行刷新进度的间隔（秒）
+REFRESH_INTERVAL = 0.25
+
+# 读取速度按最近多少秒内读取的字节数计算
+RATE_WINDOW = 5.0
+
+# 输出不是终端（例如重定向到文件）时，每隔多少秒输出一行进度
+LOG_INTERVAL = 30.0
+
+
+def format_bytes(size: float) -> str:
+    """格式化字节数"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class ProgressSnapshot(NamedTuple):
+    """某一时刻的进度"""
+    phase: str
+    files_found: int
+    bytes_found: int
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    walk_done: bool
+    elapsed: float
+    rate: float
+    eta: Optional[float]
+
+    @property
+    def fraction(self) -> float:
+        """已完成的比例（按需要读取的字节数），遍历没有结束时总量还会增加"""
+        if self.bytes_total <= 0:
+            return 1.0 if self.walk_done else 0.0
+        return min(1.0, self.bytes_done / self.bytes_total)
+
+    def format(self) -> str:
+        """单行进度（最重要的比例、速度和剩余时间在前，终端较窄时截掉的是后面的部分）"""
+        parts = []
+        if self.files_total:
+            parts.append(f"{self.fraction:.0%} {format_bytes(self.bytes_done)}/"
+                         f"{format_bytes(self.bytes_total)} {format_bytes(self.rate)}/s")
+            if self.eta is not None:
+                parts.append(f"剩余 {format_duration(self.eta)}")
+            parts.append(f"已读取 {self.files_done}/{self.files_total} 个文件")
+        parts.append(f"已发现 {self.files_found} 个文件 ({format_bytes(self.bytes_found)})")
+        return (f"{self.phase}: " if self.phase else "") + ", ".join(parts)
+
+
+class ProgressCounters:
+    """
+    扫描进度计数器（线程安全）
+
+    found 记录遍历发现的文件；scheduled 记录需要读取的文件和字节数（只有大小在两边
+    都出现的候选文件才需要读取，所以总量随遍历增加，遍历结束后才确定）；done 记录
+    已经读取完的文件和字节数。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, phase: str = ''):
+        """开始新的一次扫描"""
+        with self._lock:
+            self.phase = phase
+            self.active = bool(phase)
+            self.files_found = 0
+            self.bytes_found = 0
+            self.files_total = 0
+            self.bytes_total = 0
+            self.files_done = 0
+            self.bytes_done = 0
+            self.walk_done = False
+            self.started = time.monotonic()
+            self._samples = deque()
+
+    def set_phase(self, phase: str):
+        with self._lock:
+            self.phase = phase
+            self.active = True
+
+    def found(self, size: int):
+        with self._lock:
+            self.files_found += 1
+            self.bytes_found += size
+
+    def scheduled(self, size: int, files: int = 1):
+        with self._lock:
+            self.files_total += files
+            self.bytes_total += size
+
+    def done(self, size: int, files: int = 1):
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += size
+
+    def finish_walk(self):
+        with self._lock:
+            self.walk_done = True
+
+    def finish(self):
+        """扫描结束（ConsoleProgress 随即清除进度行）"""
+        with self._lock:
+            self.active = False
+
+    def snapshot(self) -> ProgressSnapshot:
+        """读取当前进度（由界面线程按固定频率调用）"""
+        with self._lock:
+            now = time.monotonic()
+            samples = self._samples
+            samples.append((now, self.bytes_done))
+            while len(samples) > 2 and now - samples[0][0] > RATE_WINDOW:
+                samples.popleft()
+            span = now - samples[0][0]
+            rate = (self.bytes_done - samples[0][1]) / span if span > 0 else 0.0
+            eta = None
+            if self.walk_done and rate > 0 and self.bytes_total > self.bytes_done:
+                eta = (self.bytes_total - self.bytes_done) / rate
+            return ProgressSnapshot(self.phase, self.files_found, self.bytes_found,
+                                    self.files_done, self.files_total, self.bytes_done,
+                                    self.bytes_total, self.walk_done, now - self.started,
+                                    rate, eta)
+
+
+class ScanControl:
+    """
+    暂停、继续和取消扫描（线程安全，协作式）
+
+    界面或信号处理函数调用 pause()、resume()、cancel()；扫描在遍历每个目录、提交每批
+    文件之前调用 checkpoint()：暂停时在这里等待，取消后返回 False，扫描随即停止提交
+    新的工作，等待已经开始读取的文件完成。
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def running(self) -> bool:
+        """既没有暂停也没有取消"""
+        return self._running.is_set() and not self._cancelled.is_set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 唤醒暂停中等待的线程，让它们看到取消
+        self._running.set()
+
+    def checkpoint(self) -> bool:
+        """暂停时等待继续或取消；返回 False 表示扫描已被取消"""
+        self._running.wait()
+        return not self._cancelled.is_set()
+
+    def iterate(self, items: Iterable[T]) -> Iterator[T]:
+        """逐个返回 items，暂停时等待，取消后停止"""
+        for item in items:
+            if not self.checkpoint():
+                return
+            yield item
+
+
+@contextmanager
+def cancel_on_signals(control: ScanControl) -> Iterator[ScanControl]:
+    """
+    命令行中第一次收到 SIGINT（Ctrl+C）或 SIGTERM 时取消扫描，保留已经确认的结果；
+    再收到一次则抛出 KeyboardInterrupt 立即中断。退出时恢复原来的信号处理函数。
+    只能在主线程中使用。
+
+    信号处理函数只设置取消标志，不输出任何内容（此时主线程可能正持有输出的锁），
+    取消的消息由扫描自己报告。
+    """
+    def handle(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        control.cancel()
+
+    signals = [signal.SIGINT] + ([signal.SIGTERM] if hasattr(signal, 'SIGTERM') else [])
+    previous = {signum: signal.signal(signum, handle) for signum in signals}
+    try:
+        yield control
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+class ConsoleProgress:
+    """
+    在命令行的同一行上显示扫描进度
+
+    作为上下文管理器使用：进入时启动刷新线程，退出时清除进度行。扫描过程中的其他
+    消息通过 print() 输出，先清除进度行再打印，不会与进度混在一起。输出不是终端时
+    不刷新同一行，每隔 LOG_INTERVAL 秒输出一行进度。
+    """
+
+    def __init__(self, counters: Optional[ProgressCounters] = None,
+                 stream: Optional[TextIO] = None, interval: float = REFRESH_INTERVAL):
+        self.counters = counters or ProgressCounters()
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.live = self.stream.isatty()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._width = 0
+        self._last_log = time.monotonic()
+
+    def __enter__(self) -> 'ConsoleProgress':
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            self._clear()
+
+    def print(self, message: str):
+        """输出一条消息（可以作为 progress_callback）"""
+        with self._lock:
+            self._clear()
+            print(message, file=self.stream, flush=True)
+
+    def _clear(self):
+        if self._width:
+            self.stream.write("\r" + " " * self._width + "\r")
+            self.stream.flush()
+            self._width = 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.counters.active:
+                with self._lock:
+                    self._clear()
+                continue
+            line = self.counters.snapshot().format()
+            with self._lock:
+                if self._stop.is_set():
+                    return
+                if self.live:
+                    # 超过终端宽度会换行，之后就无法用 \r 回到行首覆盖
+                    line = _truncate(line, shutil.get_terminal_size().columns - 1)
+                    self._clear()
+                    self.stream.write(line)
+                    self.stream.flush()
+                    self._width = _display_width(line)
+                elif time.monotonic() - self._last_log >= LOG_INTERVAL:
+                    self._last_log = time.monotonic()
+                    print(line, file=self.stream, flush=True)
+
+
+def _display_width(text: str) -> int:
+    """终端中的显示宽度（中文等宽字符占两列）"""
+    return sum(2 if ord(char) > 0x2E80 else 1 for char in text)
+
+
+def _truncate(text: str, width: int) -> str:
+    while text and _display_width(text) > width:
+        text = text[:-1]
+    return text
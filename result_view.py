@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复文件列表（两个 GUI 版本共用）
+所有结果只保存在内存中的 ResultRow 列表里；VirtualTreeview 只为窗口中能显示的那几十行
+创建 Treeview 行，滚动、排序时重新填入这些行的内容。结果再多，Tk 中的行数也不变，
+滚动、排序和选择的速度与结果数量基本无关。
+"""
+
+import os
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk
+from typing import Callable, Collection, Dict, List, Optional, Sequence
+
+# 鼠标滚轮每一格滚动的行数
+WHEEL_ROWS = 3
+
+
+class ResultRow:
+    """结果列表中的一行：一个重复文件（扫描时的 FileRecord）及其哈希值和选中状态"""
+
+    __slots__ = ('record', 'hash', 'selected')
+
+    def __init__(self, record, file_hash: str):
+        self.record = record
+        self.hash = file_hash
+        self.selected = False
+
+    @property
+    def path(self) -> str:
+        return self.record.path
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.record.path)
+
+    @property
+    def size(self) -> int:
+        return self.record.size
+
+    @property
+    def mtime(self) -> str:
+        """修改时间（只在显示和导出时格式化）"""
+        return datetime.fromtimestamp(self.record.mtime_ns / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+
+    def to_dict(self) -> dict:
+        """导出为 JSON 时使用的字典"""
+        return {
+            'path': self.path,
+            'name': self.name,
+            'size': self.size,
+            'hash': self.hash,
+            'mtime': self.mtime,
+            'selected': self.selected
+        }
+
+
+class SelectionModel:
+    """
+    结果的选中状态
+
+    随时保存选中的文件数量和总字节数，切换一行只需调整这两个数；全选、全不选、
+    反选一次遍历所有行后直接得出新的合计，不再重新统计。
+    """
+
+    def __init__(self, rows: Optional[List[ResultRow]] = None):
+        self.set_rows(rows or [])
+
+    def set_rows(self, rows: List[ResultRow]):
+        """使用新的结果列表（重新统计一次，之后增量维护）"""
+        self.rows = rows
+        self.total_bytes = sum(row.size for row in rows)
+        self.count = 0
+        self.bytes = 0
+        for row in rows:
+            if row.selected:
+                self.count += 1
+                self.bytes += row.size
+
+    def rows_added(self, added: Collection[ResultRow]):
+        """一些行已追加到结果中（见 VirtualTreeview.add_rows），计入合计"""
+        for row in added:
+            self.total_bytes += row.size
+            if row.selected:
+                self.count += 1
+                self.bytes += row.size
+
+    def rows_removed(self, removed: Collection[ResultRow]):
+        """一些行已从结果中去掉（见 VirtualTreeview.remove_rows），从合计中减去"""
+        for row in removed:
+            self.total_bytes -= row.size
+            if row.selected:
+                self.count -= 1
+                self.bytes -= row.size
+
+    def toggle(self, row: ResultRow) -> bool:
+        """切换一行的选中状态，返回新的状态"""
+        row.selected = not row.selected
+        sign = 1 if row.selected else -1
+        self.count += sign
+        self.bytes += sign * row.size
+        return row.selected
+
+    def select_all(self):
+        for row in self.rows:
+            row.selected = True
+        self.count = len(self.rows)
+        self.bytes = self.total_bytes
+
+    def deselect_all(self):
+        for row in self.rows:
+            row.selected = False
+        self.count = 0
+        self.bytes = 0
+
+    def invert(self):
+        for row in self.rows:
+            row.selected = not row.selected
+        self.count = len(self.rows) - self.count
+        self.bytes = self.total_bytes - self.bytes
+
+    def selected_rows(self) -> List[ResultRow]:
+        return [row for row in self.rows if row.selected]
+
+
+class VirtualTreeview:
+    """
+    虚拟化的 Treeview
+
+    Treeview 中只有可见的行（数量随窗口高度变化），每一行显示 rows[first + 位置]。
+    垂直滚动条、鼠标滚轮和方向键/翻页键都由这里处理；当前行（Treeview 的选中行）
+    记录为 ResultRow，滚动出窗口再滚回来时仍然保持。
+    """
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar,
+                 render: Callable[[ResultRow], Sequence[str]]):
+        """
+        Args:
+            tree: 显示结果的 Treeview（show="headings"），其中的行由这里管理
+            scrollbar: 垂直滚动条
+            render: 把一行结果转换为各列显示的内容
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.render = render
+        self.rows: List[ResultRow] = []
+        self.first = 0
+        self.visible = max(1, int(tree.cget('height')))
+        self._current: Optional[ResultRow] = None
+        self._sort_keys: Dict[str, Callable[[ResultRow], object]] = {}
+        self._sort_column: Optional[str] = None
+        self._sort_reverse = False
+        self._headings = {column: tree.heading(column, 'text') for column in tree['columns']}
+
+        tree.configure(selectmode='browse')
+        scrollbar.configure(command=self.yview)
+        tree.bind('<Configure>', self._on_configure)
+        tree.bind('<<TreeviewSelect>>', self._on_select)
+        tree.bind('<MouseWheel>', self._on_wheel)
+        tree.bind('<Button-4>', self._on_wheel)
+        tree.bind('<Button-5>', self._on_wheel)
+        for key, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page_up'),
+                          ('<Next>', 'page_down'), ('<Home>', 'home'), ('<End>', 'end')):
+            tree.bind(key, lambda event, step=step: self._move(step))
+
+    def set_rows(self, rows: List[ResultRow]):
+        """显示新的结果列表（列表本身被保存，排序时原地修改）"""
+        self.rows = rows
+        if self._current is not None and self._current not in rows:
+            self._current = None
+        self.first = max(0, min(self.first, len(rows) - self.visible))
+        self.refresh()
+        # 之前没有行时无法得知行高，等界面更新后再按实际高度计算可见行数
+        self.tree.after_idle(self._fit)
+
+    def add_rows(self, added: Sequence[ResultRow]):
+        """
+        在结果末尾追加行（扫描过程中陆续确认的重复文件），列表原地修改，滚动位置和
+        当前行不变。追加的行没有参与排序，所以清除排序标记。
+        """
+        if not added:
+            return
+        was_empty = not self.rows
+        self.rows.extend(added)
+        if self._sort_column is not None:
+            self._sort_column = None
+            self._update_headings()
+        self.refresh()
+        if was_empty:
+            self.tree.after_idle(self._fit)
+
+    def remove_rows(self, removed: Collection[ResultRow]):
+        """
+        从结果中去掉一些行（例如已经删除的文件），列表原地修改，与 SelectionModel
+        共用的仍是同一个列表。窗口顶部的行保持不动，不会因为上方的行被去掉而跳动。
+        """
+        above = sum(1 for row in self.rows[:self.first] if row in removed)
+        self.rows[:] = [row for row in self.rows if row not in removed]
+        if self._current in removed:
+            self._current = None
+        self.first = max(0, min(self.first - above, len(self.rows) - self.visible))
+        self.refresh()
+
+    def clear(self):
+        """清空结果，同时清除排序标记"""
+        self._current = None
+        self._sort_column = None
+        self._update_headings()
+        self.first = 0
+        self.set_rows([])
+
+    def row_at(self, item: str) -> Optional[ResultRow]:
+        """Treeview 中某一行（identify_row/selection 返回的 id）对应的结果"""
+        try:
+            index = self.first + self.tree.index(item)
+        except tk.TclError:
+            return None
+        return self.rows[index] if index < len(self.rows) else None
+
+    def current_row(self) -> Optional[ResultRow]:
+        """当前行对应的结果（当前行不在窗口中时为 None）"""
+        selection = self.tree.selection()
+        return self.row_at(selection[0]) if selection else None
+
+    def refresh(self):
+        """重新填入可见行的内容（结果或选中状态变化后调用）"""
+        count = max(0, min(self.visible, len(self.rows) - self.first))
+        items = self.tree.get_children()
+        if len(items) > count:
+            self.tree.delete(*items[count:])
+        for _ in range(len(items), count):
+            self.tree.insert('', 'end')
+        current_item = None
+        for position, item in enumerate(self.tree.get_children()):
+            row = self.rows[self.first + position]
+            self.tree.item(item, values=self.render(row))
+            if row is self._current:
+                current_item = item
+        if current_item is not None:
+            if self.tree.selection() != (current_item,):
+                self.tree.selection_set(current_item)
+            self.tree.focus(current_item)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total <= self.visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+
+    def scroll_to(self, first: int):
+        first = max(0, min(first, len(self.rows) - self.visible))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def yview(self, *args):
+        """垂直滚动条的命令（与 Treeview.yview 的参数相同）"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= max(1, self.visible - 1)
+            self.scroll_to(self.first + step)
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            step = -WHEEL_ROWS
+        elif event.num == 5:
+            step = WHEEL_ROWS
+        else:
+            step = -WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS
+        self.scroll_to(self.first + step)
+        return "break"
+
+    def _on_configure(self, event):
+        self._fit(event.height)
+
+    def _fit(self, height: Optional[int] = None):
+        """根据 Treeview 的高度重新计算可见行数（第一行的位置和高度由 bbox 给出）"""
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else ''
+        if not bbox:
+            return
+        _, top, _, row_height = bbox
+        height = self.tree.winfo_height() if height is None else height
+        visible = max(1, (height - top) // max(1, row_height))
+        if visible != self.visible:
+            self.visible = visible
+            self.first = max(0, min(self.first, len(self.rows) - self.visible))
+            self.refresh()
+
+    def _on_select(self, event):
+        # 选中行被清除（当前行滚出窗口）时保留原来的当前行
+        selection = self.tree.selection()
+        if selection:
+            self._current = self.row_at(selection[0])
+
+    def _current_index(self) -> Optional[int]:
+        if self._current is None:
+            return None
+        window = self.rows[self.first:self.first + self.visible]
+        for position, row in enumerate(window):
+            if row is self._current:
+                return self.first + position
+        try:
+            return self.rows.index(self._current)
+        except ValueError:
+            return None
+
+    def _move(self, step):
+        """方向键/翻页键移动当前行，必要时滚动使其可见"""
+        if not self.rows:
+            return "break"
+        index = self._current_index()
+        if step == 'home':
+            index = 0
+        elif step == 'end':
+            index = len(self.rows) - 1
+        elif index is None:
+            index = self.first
+        elif step == 'page_up':
+            index -= max(1, self.visible - 1)
+        elif step == 'page_down':
+            index += max(1, self.visible - 1)
+        else:
+            index += step
+        index = max(0, min(index, len(self.rows) - 1))
+        self._current = self.rows[index]
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible:
+            self.first = index - self.visible + 1
+        self.refresh()
+        return "break"
+
+    def enable_sorting(self, keys: Dict[str, Callable[[ResultRow], object]]):
+        """点击列标题按该列排序，再次点击反向排序"""
+        self._sort_keys = keys
+        for column in keys:
+            self.tree.heading(column, command=lambda column=column: self.sort(column))
+
+    def sort(self, column: str):
+        self._sort_reverse = column == self._sort_column and not self._sort_reverse
+        self._sort_column = column
+        self.rows.sort(key=self._sort_keys[column], reverse=self._sort_reverse)
+        self._update_headings()
+        # 排序后当前行仍然可见，没有当前行时回到顶部
+        index = self._current_index()
+        self.first = 0 if index is None else index - self.visible // 2
+        self.first = max(0, min(self.first, len(self.rows) - self.visible))
+        self.refresh()
+
+    def _update_headings(self):
+        for column, text in self._headings.items():
+            if column == self._sort_column:
+                text += " ▼" if self._sort_reverse else " ▲"
+            self.tree.heading(column, text=text)